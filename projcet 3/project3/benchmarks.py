@@ -0,0 +1,477 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from bitboard import BitBoard
+from board import Board
+from endgame import EndgameSolver, empties
+from expectimax import expectimax
+from evaluation import boards_to_array, evaluate_batch, evaluate_board, np
+from minimax import NegamaxSearch, minimax
+from mcts import BLACK, WHITE, MCTSTree
+from parallel import ParallelMCTS, ParallelSearch
+from player import EvaluativePlayer, FirstValidMovePlayer, IntelligentPlayer, RandomPlayer
+import perft
+from rollout import playout
+from simulator import batch_playouts, greedy_policy, play_match, random_policy
+from stability import stable_counts
+from transposition import TranspositionTable
+
+
+def sample_positions(count=12, seed=7):
+    # Deterministic mid-game positions reached by random play, as (Board, color to move)
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board()
+        color = 'W'
+        for _ in range(rng.randint(4, 40)):
+            moves = board.get_valid_moves(color)
+            if moves:
+                board.place_disc(*rng.choice(moves), color)
+            color = 'B' if color == 'W' else 'W'
+        if board.get_valid_moves(color):
+            positions.append((board, color))
+    return positions
+
+
+def legacy_count_stable_discs(board, color):
+    # The stability term evaluate_board used before stability.py, kept as a baseline
+    def is_stable(x, y):
+        directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+        for dx, dy in directions:
+            nx, ny = x + dx, y + dy
+            while 0 <= nx < board.size and 0 <= ny < board.size:
+                if board.board[nx][ny] is None:
+                    return False
+                nx += dx
+                ny += dy
+        return True
+
+    return sum(1 for x in range(board.size) for y in range(board.size)
+               if board.board[x][y] == color and is_stable(x, y))
+
+
+def legacy_simulate_random_game(board, color):
+    # MCTSPlayer's playout before rollout.py, kept as a baseline
+    current_color = color
+    while not board.is_full() and board.get_valid_moves(current_color):
+        valid_moves = board.get_valid_moves(current_color)
+        if valid_moves:
+            move = random.choice(valid_moves)
+            board.place_disc(move[0], move[1], current_color)
+        current_color = 'B' if current_color == 'W' else 'W'
+    return board.get_score()
+
+
+class LegacyBoard(Board):
+    # Board as it was before the move caches: every get_valid_moves call scans all squares
+    def get_valid_moves(self, player_color):
+        return [(row, col) for row in range(self.size) for col in range(self.size)
+                if self.is_valid_move(row, col, player_color)]
+
+
+def play_quietly(board, players):
+    # Game.start without the display, making the same get_valid_moves and is_game_over calls
+    color = 'B'
+    while not (board.is_full() or not any(board.get_valid_moves(player) for player in 'BW')):
+        if board.get_valid_moves(color):
+            row, col = players[color].make_move(board)
+            board.place_disc(row, col, color)
+        color = 'W' if color == 'B' else 'B'
+    return board.get_score()
+
+
+def walk(board, depth, color):
+    # Visit every node to `depth` through the public Board API, passing when stuck
+    if depth == 0:
+        return 1
+    opponent = 'W' if color == 'B' else 'B'
+    moves = board.get_valid_moves(color)
+    if not moves:
+        if not board.get_valid_moves(opponent):
+            return 1
+        return 1 + walk(board, depth - 1, opponent)
+    nodes = 1
+    for row, col in moves:
+        child = board.copy()
+        child.place_disc(row, col, color)
+        nodes += walk(child, depth - 1, opponent)
+    return nodes
+
+
+def bench_board(depth, search_depth):
+    print(f"{'class':<10} {'walk nodes':>10} {'walk n/s':>12} {'minimax s':>10}")
+    for board_cls in (Board, BitBoard):
+        start = time.perf_counter()
+        nodes = walk(board_cls(), depth, 'W')
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        minimax(board_cls(), search_depth, True, 'W')
+        search_time = time.perf_counter() - start
+
+        print(f"{board_cls.__name__:<10} {nodes:>10} {nodes / elapsed:>12.0f} {search_time:>10.3f}")
+
+
+def bench_search(depth):
+    positions = sample_positions()
+    searches = [("minimax", minimax), ("expectimax", expectimax)]
+    print(f"{'search':<11} {'class':<10} {'seconds':>8} {'peak KiB':>9}")
+    for name, search in searches:
+        for board_cls in (Board, BitBoard):
+            boards = [(board_cls.from_board(b) if board_cls is BitBoard else b.copy(), color)
+                      for b, color in positions]
+            start = time.perf_counter()
+            for board, color in boards:
+                search(board, depth, True, color)
+            elapsed = time.perf_counter() - start
+
+            # tracemalloc slows everything down, so peak memory gets its own pass
+            tracemalloc.start()
+            search(boards[0][0], depth, True, boards[0][1])
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<11} {board_cls.__name__:<10} {elapsed:>8.3f} {peak / 1024:>9.1f}")
+
+
+def bench_star(depth):
+    # Plain expectimax against Star1/Star2 pruning with and without the chance-node cache
+    positions = sample_positions()
+    variants = [("plain", {}), ("star", {"pruning": True}), ("star+cache", {"pruning": True, "cache": True})]
+    reference = None
+    print(f"{'variant':<11} {'seconds':>8} {'same values':>11}")
+    for name, options in variants:
+        start = time.perf_counter()
+        results = []
+        for board, color in positions:
+            cache = TranspositionTable() if options.get("cache") else None
+            results.append(expectimax(board, depth, True, color, pruning=options.get("pruning", False), cache=cache))
+        elapsed = time.perf_counter() - start
+        reference = reference or results
+        print(f"{name:<11} {elapsed:>8.3f} {str(results == reference):>11}")
+
+
+def endgame_positions(count, empty_squares, seed=11):
+    # Positions with `empty_squares` empties reached by random play, side to move able to move
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board()
+        color = 'B'
+        while empties(board) > empty_squares:
+            moves = board.get_valid_moves(color)
+            if moves:
+                board.place_disc(*rng.choice(moves), color)
+            elif not board.get_valid_moves('B' if color == 'W' else 'W'):
+                break
+            color = 'B' if color == 'W' else 'W'
+        if empties(board) == empty_squares and board.get_valid_moves(color):
+            positions.append((board, color))
+    return positions
+
+
+def bench_endgame(empty_squares, count):
+    # Exact endgame solves against the move depth-3 minimax picks in the same position
+    print(f"{'position':>8} {'score':>6} {'nodes':>10} {'seconds':>8} {'nodes/s':>9} {'minimax agrees':>14}")
+    solver = EndgameSolver()
+    for index, (board, color) in enumerate(endgame_positions(count, empty_squares)):
+        move, score = solver.solve(board, color)
+        stats = solver.stats
+        heuristic, _ = minimax(board.copy(), 3, True, color)
+        print(f"{index:>8} {score:>+6} {stats['nodes']:>10} {stats['seconds']:>8.3f} "
+              f"{stats['nodes'] / stats['seconds']:>9.0f} {str(heuristic == move):>14}")
+
+
+def bench_games(count):
+    # Full games between the one-ply players on Board against the uncached LegacyBoard
+    pairings = [(RandomPlayer, RandomPlayer), (FirstValidMovePlayer, RandomPlayer),
+                (IntelligentPlayer, EvaluativePlayer), (EvaluativePlayer, RandomPlayer)]
+    print(f"{'pairing':<40} {'Board':>8} {'legacy':>8} {'speedup':>7} {'same games':>10}")
+    for black_cls, white_cls in pairings:
+        results = []
+        for board_cls in (Board, LegacyBoard):
+            scores = []
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for game in range(count):
+                    players = {'B': black_cls('B'), 'W': white_cls('W')}
+                    random.seed(game)
+                    scores.append(play_quietly(board_cls(), players))
+            results.append((time.perf_counter() - start, scores))
+        (fast, fast_scores), (slow, slow_scores) = results
+        name = f"{black_cls.__name__} vs {white_cls.__name__}"
+        print(f"{name:<40} {fast:>8.3f} {slow:>8.3f} {slow / fast:>6.1f}x {str(fast_scores == slow_scores):>10}")
+
+
+def bench_nodes(depth):
+    # Full-width minimax against PVS with move ordering and a transposition table
+    print(f"{'position':>8} {'minimax':>10} {'pvs':>8} {'ratio':>7} {'same score':>10}")
+    plain_total = pvs_total = 0
+    for index, (board, color) in enumerate(sample_positions()):
+        plain = NegamaxSearch(pruning_enabled=False)
+        plain_score = plain.negamax(board, depth, color)
+        pvs = NegamaxSearch(TranspositionTable())
+        _, pvs_score, _ = pvs.iterate(board, color, depth)
+        plain_total += plain.nodes
+        pvs_total += pvs.nodes
+        print(f"{index:>8} {plain.nodes:>10} {pvs.nodes:>8} {plain.nodes / pvs.nodes:>7.1f} "
+              f"{str(plain_score == pvs_score):>10}")
+    print(f"{'total':>8} {plain_total:>10} {pvs_total:>8} {plain_total / pvs_total:>7.1f}")
+
+
+def bench_stability(repeat):
+    positions = [board for board, _ in sample_positions(count=50)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board in positions:
+            legacy_count_stable_discs(board, 'B')
+            legacy_count_stable_discs(board, 'W')
+    legacy = (time.perf_counter() - start) / (repeat * len(positions))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board in positions:
+            stable_counts(board)
+    current = (time.perf_counter() - start) / (repeat * len(positions))
+
+    legacy_total = sum(legacy_count_stable_discs(b, 'B') + legacy_count_stable_discs(b, 'W') for b in positions)
+    current_total = sum(sum(stable_counts(b)) for b in positions)
+    print(f"legacy is_stable scan: {legacy * 1e6:8.1f} us/position, {legacy_total} stable discs")
+    print(f"stability.py:          {current * 1e6:8.1f} us/position, {current_total} stable discs")
+
+
+def bench_evaluate(count):
+    # One evaluate_batch call against evaluate_board in a loop, on the same positions
+    boards = [BitBoard.from_board(board) for board, _ in sample_positions(count=count)]
+    start = time.perf_counter()
+    scalar = [evaluate_board(board, 'B') for board in boards]
+    scalar_time = time.perf_counter() - start
+
+    positions = boards_to_array(boards)
+    start = time.perf_counter()
+    batch = evaluate_batch(positions, 'B')
+    batch_time = time.perf_counter() - start
+
+    assert scalar == [int(score) for score in batch]
+    print(f"evaluate_board: {count / scalar_time:10.0f} positions/s")
+    print(f"evaluate_batch: {count / batch_time:10.0f} positions/s")
+
+
+def bench_parallel(depth, max_workers):
+    # Serial search time against the root-split search with 1..max_workers processes
+    positions = sample_positions(count=6)
+    start = time.perf_counter()
+    serial = [NegamaxSearch(TranspositionTable()).iterate(board, color, depth)[:2] for board, color in positions]
+    serial_time = time.perf_counter() - start
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8} {'same moves':>10}")
+    print(f"{'serial':>7} {serial_time:>8.2f} {1.0:>8.2f} {'':>10}")
+    for workers in range(1, max_workers + 1):
+        search = ParallelSearch(workers, TranspositionTable())
+        start = time.perf_counter()
+        found = [search.iterate(board, color, depth)[:2] for board, color in positions]
+        elapsed = time.perf_counter() - start
+        search.close()
+        print(f"{workers:>7} {elapsed:>8.2f} {serial_time / elapsed:>8.2f} {str(found == serial):>10}")
+
+
+def bench_playouts(simulations, max_workers):
+    # MCTS playouts per second from the opening, one tree against root-parallel trees
+    board = Board()
+    tree = MCTSTree(rng=random.Random(0))
+    tree.set_root(board.black, board.white, BLACK)
+    start = time.perf_counter()
+    tree.search(simulations)
+    serial = simulations / (time.perf_counter() - start)
+    print(f"{'workers':>7} {'playouts/s':>10} {'speedup':>8}")
+    print(f"{'serial':>7} {serial:>10.0f} {1.0:>8.2f}")
+    for workers in range(1, max_workers + 1):
+        search = ParallelMCTS(workers, seed=0)
+        search.search(board.black, board.white, BLACK, workers)  # start the worker processes
+        start = time.perf_counter()
+        search.search(board.black, board.white, BLACK, simulations)
+        rate = search.playouts / (time.perf_counter() - start)
+        search.close()
+        print(f"{workers:>7} {rate:>10.0f} {rate / serial:>8.2f}")
+
+
+def bench_rollout(count):
+    # Random playouts from the opening: the old Board loop against the rollout kernel
+    board = Board()
+    start = time.perf_counter()
+    for _ in range(count):
+        legacy_simulate_random_game(board.copy(), 'B')
+    legacy = count / (time.perf_counter() - start)
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(count):
+        playout(board.black, board.white, BLACK, rng)
+    kernel = count / (time.perf_counter() - start)
+    print(f"Board loop:     {legacy:8.0f} playouts/s")
+    print(f"rollout kernel: {kernel:8.0f} playouts/s ({kernel / legacy:.1f}x)")
+
+
+def bench_batch(count):
+    # Random games per second from the opening: rollout kernel one at a time vs the NumPy batch simulator
+    board = Board()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(count // 10):
+        playout(board.black, board.white, BLACK, rng)
+    kernel = count // 10 / (time.perf_counter() - start)
+    print(f"rollout kernel:  {kernel:8.0f} games/s")
+    for size in sorted({64, 1024, count}):
+        if size > count:
+            continue  # would not play a single batch
+        generator = np.random.default_rng(0)
+        start = time.perf_counter()
+        for _ in range(count // size):
+            batch_playouts(board.black, board.white, BLACK, size, generator)
+        rate = count // size * size / (time.perf_counter() - start)
+        print(f"batch of {size:>6}: {rate:8.0f} games/s ({rate / kernel:.1f}x)")
+    wins, losses, draws = play_match(greedy_policy, random_policy, count, seed=0)
+    print(f"greedy (black) vs random: {wins} wins, {losses} losses, {draws} draws")
+
+
+def bench_suite(output, compare, depth):
+    """Fixed-position search benchmarks written to `output` as JSON.
+
+    Covers perft from every reference position, minimax (time to depth, nodes,
+    best move), expectimax and MCTS. With `compare` the times, nodes and moves
+    are checked against an earlier output file.
+    """
+    results = []
+    for result in perft.run(5):
+        results.append({'benchmark': 'perft', 'position': f"{result['position']}/{result['depth']}",
+                        'seconds': result['seconds'], 'nodes': result['nodes'], 'ok': result['ok']})
+
+    for name, board, color, _ in perft.reference_positions():
+        if board.is_terminal():
+            continue
+        search = NegamaxSearch(TranspositionTable())
+        start = time.perf_counter()
+        move, score, _ = search.iterate(board, color, depth)
+        results.append({'benchmark': f'minimax/{depth}', 'position': name, 'seconds': time.perf_counter() - start,
+                        'nodes': search.nodes, 'move': move, 'score': score})
+
+        start = time.perf_counter()
+        move, value = expectimax(board.copy(), 3, True, color)
+        results.append({'benchmark': 'expectimax/3', 'position': name, 'seconds': time.perf_counter() - start,
+                        'move': move, 'score': value})
+
+        tree = MCTSTree(rng=random.Random(0))
+        tree.set_root(board.black, board.white, BLACK if color == 'B' else WHITE)
+        start = time.perf_counter()
+        tree.search(1000)
+        square = tree.best_move()
+        results.append({'benchmark': 'mcts/1000', 'position': name, 'seconds': time.perf_counter() - start,
+                        'nodes': len(tree), 'move': None if square is None or square < 0 else divmod(square, 8)})
+
+    for result in results:
+        if isinstance(result.get('move'), tuple):
+            result['move'] = list(result['move'])
+    with open(output, 'w') as handle:
+        json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}, handle, indent=2)
+
+    previous = {}
+    if compare:
+        with open(compare) as handle:
+            previous = {(old['benchmark'], old['position']): old for old in json.load(handle)['results']}
+    print(f"{'benchmark':<13} {'position':<10} {'seconds':>8} {'nodes':>9} {'move':>8} {'vs old':>8}  changes")
+    for result in results:
+        old = previous.get((result['benchmark'], result['position']))
+        ratio = f"{result['seconds'] / old['seconds']:.2f}x" if old and old['seconds'] else ''
+        changes = [key for key in ('nodes', 'move', 'score') if old and key in result and old.get(key) != result[key]]
+        move = '' if result.get('move') is None else str(tuple(result['move']))
+        print(f"{result['benchmark']:<13} {result['position']:<10} {result['seconds']:>8.3f} "
+              f"{result.get('nodes', ''):>9} {move:>8} {ratio:>8}  {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Othello engine benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    board_parser = sub.add_parser("board", help="Board vs BitBoard nodes per second")
+    board_parser.add_argument("--depth", type=int, default=6)
+    board_parser.add_argument("--search-depth", type=int, default=3)
+
+    search_parser = sub.add_parser("search", help="minimax and expectimax time and peak memory")
+    search_parser.add_argument("--depth", type=int, default=3)
+
+    nodes_parser = sub.add_parser("nodes", help="node counts of full-width minimax vs PVS")
+    nodes_parser.add_argument("--depth", type=int, default=4)
+
+    stability_parser = sub.add_parser("stability", help="stable-disc counting vs the old is_stable scan")
+    stability_parser.add_argument("--repeat", type=int, default=20)
+
+    evaluate_parser = sub.add_parser("evaluate", help="scalar vs batched NumPy evaluation")
+    evaluate_parser.add_argument("--count", type=int, default=2000)
+
+    parallel_parser = sub.add_parser("parallel", help="parallel root search speedup against the number of workers")
+    parallel_parser.add_argument("--depth", type=int, default=5)
+    parallel_parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    playouts_parser = sub.add_parser("playouts", help="MCTS playouts per second against the number of workers")
+    playouts_parser.add_argument("--simulations", type=int, default=2000)
+    playouts_parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    rollout_parser = sub.add_parser("rollout", help="random playouts per second, Board loop vs rollout kernel")
+    rollout_parser.add_argument("--count", type=int, default=500)
+
+    batch_parser = sub.add_parser("batch", help="NumPy batch game simulator throughput")
+    batch_parser.add_argument("--count", type=int, default=8192)
+
+    star_parser = sub.add_parser("star", help="expectimax with and without Star1/Star2 pruning and the cache")
+    star_parser.add_argument("--depth", type=int, default=3)
+
+    endgame_parser = sub.add_parser("endgame", help="exact endgame solve time and nodes")
+    endgame_parser.add_argument("--empties", type=int, default=12)
+    endgame_parser.add_argument("--count", type=int, default=5)
+
+    games_parser = sub.add_parser("games", help="full games between the one-ply players, cached vs uncached moves")
+    games_parser.add_argument("--count", type=int, default=50)
+
+    suite_parser = sub.add_parser("suite", help="perft and fixed-position search benchmarks written to a JSON file")
+    suite_parser.add_argument("--output", default="benchmark_results.json")
+    suite_parser.add_argument("--compare", help="earlier output file to compare against")
+    suite_parser.add_argument("--depth", type=int, default=4, help="minimax depth")
+
+    args = parser.parse_args()
+    if args.command == "board":
+        bench_board(args.depth, args.search_depth)
+    elif args.command == "search":
+        bench_search(args.depth)
+    elif args.command == "nodes":
+        bench_nodes(args.depth)
+    elif args.command == "stability":
+        bench_stability(args.repeat)
+    elif args.command == "evaluate":
+        bench_evaluate(args.count)
+    elif args.command == "parallel":
+        bench_parallel(args.depth, args.workers)
+    elif args.command == "playouts":
+        bench_playouts(args.simulations, args.workers)
+    elif args.command == "rollout":
+        bench_rollout(args.count)
+    elif args.command == "batch":
+        if args.count < 10:
+            batch_parser.error("--count must be at least 10; the rollout kernel plays a tenth of it")
+        bench_batch(args.count)
+    elif args.command == "star":
+        bench_star(args.depth)
+    elif args.command == "endgame":
+        bench_endgame(args.empties, args.count)
+    elif args.command == "games":
+        bench_games(args.count)
+    elif args.command == "suite":
+        bench_suite(args.output, args.compare, args.depth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+from board import SQUARE_WEIGHTS, MovePreview
+from zobrist import ZOBRIST, ZOBRIST_FLIP
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE  # every square except column 0
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F  # every square except column 7
+CORNERS = 0x8100000000000081
+EDGES = 0x7E8181818181817E  # edge squares other than the corners
+SQUARE_VALUES = [SQUARE_WEIGHTS[index >> 3][index & 7] for index in range(64)]
+
+# Square (row, col) is bit row * 8 + col. Each direction is a shift amount
+# plus the mask that stops discs wrapping around to the other side of the board.
+LEFT_SHIFTS = [(1, NOT_A_FILE), (8, FULL), (9, NOT_A_FILE), (7, NOT_H_FILE)]
+RIGHT_SHIFTS = [(1, NOT_H_FILE), (8, FULL), (9, NOT_H_FILE), (7, NOT_A_FILE)]
+
+
+def square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def bits_to_moves(mask):
+    # Expand a mask into (row, col) tuples in row-major order, like Board.get_valid_moves
+    moves = []
+    while mask:
+        low = mask & -mask
+        index = low.bit_length() - 1
+        moves.append((index >> 3, index & 7))
+        mask ^= low
+    return moves
+
+
+def legal_moves_mask(own, opp):
+    # Kogge-Stone style fill: walk runs of opponent discs from every own disc at once
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for shift, mask in LEFT_SHIFTS:
+        run_mask = opp & mask
+        x = (own << shift) & run_mask
+        x |= (x << shift) & run_mask
+        x |= (x << shift) & run_mask
+        x |= (x << shift) & run_mask
+        x |= (x << shift) & run_mask
+        x |= (x << shift) & run_mask
+        moves |= (x << shift) & mask & empty
+    for shift, mask in RIGHT_SHIFTS:
+        run_mask = opp & mask
+        x = (own >> shift) & run_mask
+        x |= (x >> shift) & run_mask
+        x |= (x >> shift) & run_mask
+        x |= (x >> shift) & run_mask
+        x |= (x >> shift) & run_mask
+        x |= (x >> shift) & run_mask
+        moves |= (x >> shift) & mask & empty
+    return moves
+
+
+def flips_mask(own, opp, move):
+    # Discs flipped by playing the single-bit mask `move` for the side owning `own`
+    flips = 0
+    for shift, mask in LEFT_SHIFTS:
+        run = 0
+        x = (move << shift) & mask
+        while x & opp:
+            run |= x
+            x = (x << shift) & mask
+        if x & own:
+            flips |= run
+    for shift, mask in RIGHT_SHIFTS:
+        run = 0
+        x = (move >> shift) & mask
+        while x & opp:
+            run |= x
+            x = (x >> shift) & mask
+        if x & own:
+            flips |= run
+    return flips
+
+
+def hash_masks(black, white):
+    # Zobrist hash of a position given as two masks, matching Board.hash
+    h = 0
+    while black:
+        low = black & -black
+        h ^= ZOBRIST['B'][low.bit_length() - 1]
+        black ^= low
+    while white:
+        low = white & -white
+        h ^= ZOBRIST['W'][low.bit_length() - 1]
+        white ^= low
+    return h
+
+
+def positional_sum(mask):
+    # Sum of SQUARE_WEIGHTS over the squares in `mask`
+    total = 0
+    while mask:
+        low = mask & -mask
+        total += SQUARE_VALUES[low.bit_length() - 1]
+        mask ^= low
+    return total
+
+
+def flip_deltas(flips):
+    # Hash delta and positional weight of turning every disc in `flips` to the other colour
+    h = 0
+    weight = 0
+    while flips:
+        low = flips & -flips
+        index = low.bit_length() - 1
+        h ^= ZOBRIST_FLIP[index]
+        weight += SQUARE_VALUES[index]
+        flips ^= low
+    return h, weight
+
+
+class BitBoard:
+    """Drop-in replacement for Board that keeps each colour as a 64-bit mask."""
+
+    def __init__(self, size=8):
+        if size != 8:
+            raise ValueError("BitBoard only supports an 8x8 board")
+        self.size = size
+        self.black = 0
+        self.white = 0
+        self._grid = None
+        self._initialize_board()
+
+    @classmethod
+    def from_board(cls, board):
+        """Build a BitBoard holding the same position as any Board-like object."""
+        new_board = cls.__new__(cls)
+        new_board.size = 8
+        new_board.board = board.board
+        return new_board
+
+    @classmethod
+    def from_masks(cls, black, white):
+        new_board = cls.__new__(cls)
+        new_board.size = 8
+        new_board.black = black
+        new_board.white = white
+        new_board._recount()
+        return new_board
+
+    def _initialize_board(self):
+        # Set up the initial four discs in the center
+        self.white = square_bit(3, 3) | square_bit(4, 4)
+        self.black = square_bit(3, 4) | square_bit(4, 3)
+        self._recount()
+
+    def _recount(self):
+        # Rebuild the hash and positional sums from the masks
+        self.hash = hash_masks(self.black, self.white)
+        self.positional = {'B': positional_sum(self.black), 'W': positional_sum(self.white)}
+        self._grid = None
+
+    @property
+    def discs(self):
+        return {'B': self.black.bit_count(), 'W': self.white.bit_count()}
+
+    @property
+    def corners(self):
+        return {'B': (self.black & CORNERS).bit_count(), 'W': (self.white & CORNERS).bit_count()}
+
+    @property
+    def edges(self):
+        return {'B': (self.black & EDGES).bit_count(), 'W': (self.white & EDGES).bit_count()}
+
+    def _masks(self, player_color):
+        if player_color == 'B':
+            return self.black, self.white
+        return self.white, self.black
+
+    def _set_masks(self, player_color, own, opp):
+        if player_color == 'B':
+            self.black, self.white = own, opp
+        else:
+            self.white, self.black = own, opp
+        self._grid = None
+
+    @property
+    def board(self):
+        # Read-only 8x8 view for code written against Board.board
+        if self._grid is None:
+            self._grid = [
+                ['B' if self.black >> (row * 8 + col) & 1 else 'W' if self.white >> (row * 8 + col) & 1 else None
+                 for col in range(8)]
+                for row in range(8)
+            ]
+        return self._grid
+
+    @board.setter
+    def board(self, grid):
+        self.black = 0
+        self.white = 0
+        for row in range(8):
+            for col in range(8):
+                if grid[row][col] == 'B':
+                    self.black |= square_bit(row, col)
+                elif grid[row][col] == 'W':
+                    self.white |= square_bit(row, col)
+        self._recount()
+
+    def is_terminal(self):
+        return not legal_moves_mask(self.black, self.white) and not legal_moves_mask(self.white, self.black)
+
+    def display(self):
+        # Print the board state
+        for row in self.board:
+            print(' '.join([disc if disc else '.' for disc in row]))
+        print()
+
+    def get_valid_moves_mask(self, player_color):
+        own, opp = self._masks(player_color)
+        return legal_moves_mask(own, opp)
+
+    def get_valid_moves(self, player_color):
+        # Return a list of valid moves (row, col) for the player
+        return bits_to_moves(self.get_valid_moves_mask(player_color))
+
+    def is_valid_move(self, row, col, player_color):
+        return bool(self.get_valid_moves_mask(player_color) & square_bit(row, col))
+
+    def preview_move(self, row, col, player_color):
+        """MovePreview of playing (row, col), or None if the move is not legal; the board is unchanged."""
+        move = square_bit(row, col)
+        own, opp = self._masks(player_color)
+        if (own | opp) & move:
+            return None
+        flips = flips_mask(own, opp, move)
+        if not flips:
+            return None
+        own, opp = own | move | flips, opp ^ flips
+        black, white = (own, opp) if player_color == 'B' else (opp, own)
+        return MovePreview(flips, black.bit_count(), white.bit_count(), int(move & CORNERS != 0),
+                           int(move & EDGES != 0) + 2 * (flips & EDGES).bit_count(),
+                           SQUARE_VALUES[move.bit_length() - 1] + 2 * positional_sum(flips))
+
+    def place_disc(self, row, col, player_color):
+        # Place a disc and flip opponent's discs
+        return self.make_move(row, col, player_color) is not None
+
+    def flip_discs(self, row, col, player_color):
+        # Flip the opponent's discs bracketed by (row, col)
+        own, opp = self._masks(player_color)
+        flips = flips_mask(own, opp, square_bit(row, col))
+        self._set_masks(player_color, own | flips, opp & ~flips)
+        self._apply_flip_deltas(flips, player_color)
+
+    def make_move(self, row, col, player_color):
+        # Place a disc in place and return an undo record, or None if the move is invalid
+        move = square_bit(row, col)
+        own, opp = self._masks(player_color)
+        if (own | opp) & move:
+            return None
+        flips = flips_mask(own, opp, move)
+        if not flips:
+            return None
+        self._set_masks(player_color, own | move | flips, opp & ~flips)
+        index = move.bit_length() - 1
+        self.hash ^= ZOBRIST[player_color][index]
+        self.positional[player_color] += SQUARE_VALUES[index]
+        self._apply_flip_deltas(flips, player_color)
+        return move, flips
+
+    def unmake_move(self, record):
+        # Restore the position from before the make_move that returned `record`
+        move, flips = record
+        if self.black & move:
+            player_color, opponent_color = 'B', 'W'
+            self.black ^= move | flips
+            self.white |= flips
+        else:
+            player_color, opponent_color = 'W', 'B'
+            self.white ^= move | flips
+            self.black |= flips
+        index = move.bit_length() - 1
+        self.hash ^= ZOBRIST[player_color][index]
+        self.positional[player_color] -= SQUARE_VALUES[index]
+        self._apply_flip_deltas(flips, opponent_color)
+        self._grid = None
+
+    def _apply_flip_deltas(self, flips, player_color):
+        # Update hash and positional sums after `flips` turned to `player_color`
+        h, weight = flip_deltas(flips)
+        self.hash ^= h
+        self.positional[player_color] += weight
+        self.positional['W' if player_color == 'B' else 'B'] -= weight
+
+    def is_full(self):
+        return (self.black | self.white) == FULL
+
+    def get_score(self):
+        # Return the score as a tuple (B_score, W_score)
+        return self.black.bit_count(), self.white.bit_count()
+
+    def copy(self):
+        """Create a copy of the current board state."""
+        new_board = BitBoard.__new__(BitBoard)
+        new_board.size = 8
+        new_board.black = self.black
+        new_board.white = self.white
+        new_board.hash = self.hash
+        new_board.positional = self.positional.copy()
+        new_board._grid = None
+        return new_board
@@ -1,93 +1,370 @@
+from collections import namedtuple
+
+from zobrist import ZOBRIST, ZOBRIST_FLIP, hash_grid
+
+# Static value of each square: corners are best, the squares that give a corner away are worst
+SQUARE_WEIGHTS = [
+    [100, -20, 10, 5, 5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10, 5, 5, 10, -20, 100],
+]
+
+DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+
+# Result of Board.preview_move: the mask of discs the move flips, the black and white
+# disc counts after it, and how much it changes the mover-minus-opponent corner, edge
+# and positional differences
+MovePreview = namedtuple('MovePreview', ['flips', 'black', 'white', 'corners', 'edges', 'positional'])
+
+_feature_tables = {}
+_geometry_tables = {}
+
+
+def square_features(size):
+    # Per-square (is corner, is non-corner edge, positional weight), indexed row * size + col
+    if size not in _feature_tables:
+        last = size - 1
+        corner, edge, weight = [], [], []
+        for row in range(size):
+            for col in range(size):
+                on_row_edge = row in (0, last)
+                on_col_edge = col in (0, last)
+                corner.append(int(on_row_edge and on_col_edge))
+                edge.append(int(on_row_edge != on_col_edge))
+                weight.append(SQUARE_WEIGHTS[row][col] if size == 8 else 0)
+        _feature_tables[size] = (corner, edge, weight)
+    return _feature_tables[size]
+
+
+def square_geometry(size):
+    # Per-square masks of the neighbouring squares and of every square on the row, column
+    # and both diagonals through the square (itself included), indexed row * size + col
+    if size not in _geometry_tables:
+        neighbours, lines = [], []
+        for row in range(size):
+            for col in range(size):
+                near = 0
+                line = 1 << (row * size + col)
+                for dr, dc in DIRECTIONS:
+                    r, c = row + dr, col + dc
+                    if 0 <= r < size and 0 <= c < size:
+                        near |= 1 << (r * size + c)
+                    while 0 <= r < size and 0 <= c < size:
+                        line |= 1 << (r * size + c)
+                        r += dr
+                        c += dc
+                neighbours.append(near)
+                lines.append(line)
+        _geometry_tables[size] = (neighbours, lines)
+    return _geometry_tables[size]
+
+
 class Board:
+    """Othello board as a grid of None/'B'/'W', with incrementally kept features.
+
+    Besides the hash, colour masks and feature counts, the board keeps the
+    frontier (mask of empty squares next to a disc) and per-colour legal-move
+    caches. A change to a square only marks the squares on its lines for
+    rechecking, so get_valid_moves on an unchanged position returns the cached
+    list and otherwise rechecks only marked frontier squares. The list returned
+    is shared and must not be modified.
+    """
+
     def __init__(self, size=8):
         self.size = size
-        self.board = [[None for _ in range(size)] for _ in range(size)]
+        self._cells = [[None for _ in range(size)] for _ in range(size)]
         self._initialize_board()
 
+    @property
+    def board(self):
+        return self._cells
+
+    @board.setter
+    def board(self, grid):
+        # Assigning a whole grid recomputes the incremental state derived from it
+        self._cells = grid
+        self._recount()
+
+    def _recount(self):
+        # Rebuild the hash, masks, feature counts, frontier and move caches from scratch
+        corner, edge, weight = square_features(self.size)
+        self.hash = hash_grid(self._cells)
+        self.black = 0
+        self.white = 0
+        self.discs = {'B': 0, 'W': 0}
+        self.corners = {'B': 0, 'W': 0}
+        self.edges = {'B': 0, 'W': 0}
+        self.positional = {'B': 0, 'W': 0}
+        for row in range(self.size):
+            for col in range(self.size):
+                disc = self._cells[row][col]
+                if disc is not None:
+                    index = row * self.size + col
+                    if disc == 'B':
+                        self.black |= 1 << index
+                    else:
+                        self.white |= 1 << index
+                    self.discs[disc] += 1
+                    self.corners[disc] += corner[index]
+                    self.edges[disc] += edge[index]
+                    self.positional[disc] += weight[index]
+        neighbours, _ = square_geometry(self.size)
+        occupied = self.black | self.white
+        self.frontier = 0
+        for index in range(self.size * self.size):
+            if not occupied >> index & 1 and neighbours[index] & occupied:
+                self.frontier |= 1 << index
+        every_square = (1 << self.size * self.size) - 1
+        self._legal = {'B': 0, 'W': 0}  # legal-move masks, valid outside the dirty squares
+        self._dirty = {'B': every_square, 'W': every_square}  # squares to recheck
+        self._moves = {'B': None, 'W': None}  # cached get_valid_moves lists
+
+    def _invalidate(self, lines):
+        # Squares on `lines` may have changed legality for both colours
+        self._dirty['B'] |= lines
+        self._dirty['W'] |= lines
+        self._moves['B'] = self._moves['W'] = None
+
     def is_terminal(self):
         return not self.get_valid_moves('B') and not self.get_valid_moves('W')
 
     def _initialize_board(self):
         # Set up the initial four discs in the center
         mid = self.size // 2
-        self.board[mid-1][mid-1] = 'W'
-        self.board[mid][mid] = 'W'
-        self.board[mid-1][mid] = 'B'
-        self.board[mid][mid-1] = 'B'
+        self._cells[mid-1][mid-1] = 'W'
+        self._cells[mid][mid] = 'W'
+        self._cells[mid-1][mid] = 'B'
+        self._cells[mid][mid-1] = 'B'
+        self._recount()
 
     def display(self):
         # Print the board state
-        for row in self.board:
+        for row in self._cells:
             print(' '.join([disc if disc else '.' for disc in row]))
         print()
 
     def get_valid_moves(self, player_color):
-        # Return a list of valid moves (row, col) for the player
+        # Return a list of valid moves (row, col) for the player, in row-major order
+        valid_moves = self._moves[player_color]
+        if valid_moves is not None:
+            return valid_moves
+        size = self.size
+        legal = self._legal[player_color]
+        dirty = self._dirty[player_color]
+        if dirty:
+            # Only empty squares next to a disc can be legal
+            legal &= ~dirty
+            check = dirty & self.frontier
+            while check:
+                low = check & -check
+                index = low.bit_length() - 1
+                if self.is_valid_move(index // size, index % size, player_color):
+                    legal |= low
+                check ^= low
+            self._legal[player_color] = legal
+            self._dirty[player_color] = 0
         valid_moves = []
-        for row in range(self.size):
-            for col in range(self.size):
-                if self.is_valid_move(row, col, player_color):
-                    valid_moves.append((row, col))
+        while legal:
+            low = legal & -legal
+            index = low.bit_length() - 1
+            valid_moves.append((index // size, index % size))
+            legal ^= low
+        self._moves[player_color] = valid_moves
         return valid_moves
 
     def is_valid_move(self, row, col, player_color):
         # Check if placing a disc on (row, col) is valid
-        if self.board[row][col] is not None:
+        cells = self._cells
+        if cells[row][col] is not None:
             return False
 
         opponent_color = 'W' if player_color == 'B' else 'B'
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-
-        for dr, dc in directions:
+        for dr, dc in DIRECTIONS:
             r, c = row + dr, col + dc
             found_opponent = False
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == opponent_color:
+            while 0 <= r < self.size and 0 <= c < self.size and cells[r][c] == opponent_color:
                 r += dr
                 c += dc
                 found_opponent = True
 
-            if found_opponent and 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player_color:
+            if found_opponent and 0 <= r < self.size and 0 <= c < self.size and cells[r][c] == player_color:
                 return True
         return False
 
+    def preview_move(self, row, col, player_color):
+        """MovePreview of playing (row, col), or None if the move is not legal.
+
+        The board is neither changed nor copied.
+        """
+        cells = self._cells
+        if cells[row][col] is not None:
+            return None
+        size = self.size
+        _, edge, weight = square_features(size)
+        opponent_color = 'W' if player_color == 'B' else 'B'
+        flips = count = edges = positional = 0
+        for dr, dc in DIRECTIONS:
+            r, c = row + dr, col + dc
+            run = run_count = run_edges = run_positional = 0
+            while 0 <= r < size and 0 <= c < size and cells[r][c] == opponent_color:
+                index = r * size + c
+                run |= 1 << index
+                run_count += 1
+                run_edges += edge[index]
+                run_positional += weight[index]
+                r += dr
+                c += dc
+            if run and 0 <= r < size and 0 <= c < size and cells[r][c] == player_color:
+                flips |= run
+                count += run_count
+                edges += run_edges
+                positional += run_positional
+        if not flips:
+            return None
+        corner, _, _ = square_features(size)
+        index = row * size + col
+        black, white = self.discs['B'], self.discs['W']
+        if player_color == 'B':
+            black, white = black + count + 1, white - count
+        else:
+            black, white = black - count, white + count + 1
+        # A flipped disc counts once for the mover and once against the opponent
+        return MovePreview(flips, black, white, corner[index], edge[index] + 2 * edges,
+                           weight[index] + 2 * positional)
+
     def place_disc(self, row, col, player_color):
         # Place a disc and flip opponent's discs
-        if not self.is_valid_move(row, col, player_color):
-            return False
-
-        self.board[row][col] = player_color
-        self.flip_discs(row, col, player_color)
-        return True
+        return self.make_move(row, col, player_color) is not None
 
     def flip_discs(self, row, col, player_color):
         # Flip the opponent's discs
-        opponent_color = 'W' if player_color == 'B' else 'B'
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+        self._flip(self._bracketed(row, col, player_color), player_color)
 
-        for dr, dc in directions:
+    def _bracketed(self, row, col, player_color):
+        # Opponent discs that a disc of `player_color` on (row, col) would flip
+        cells = self._cells
+        opponent_color = 'W' if player_color == 'B' else 'B'
+        flipped = []
+        for dr, dc in DIRECTIONS:
             r, c = row + dr, col + dc
-            flip_positions = []
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == opponent_color:
-                flip_positions.append((r, c))
+            run = []
+            while 0 <= r < self.size and 0 <= c < self.size and cells[r][c] == opponent_color:
+                run.append((r, c))
                 r += dr
                 c += dc
+            if run and 0 <= r < self.size and 0 <= c < self.size and cells[r][c] == player_color:
+                flipped.extend(run)
+        return flipped
+
+    def _flip(self, squares, player_color):
+        # Turn opponent discs on `squares` to `player_color`, keeping hash and counts in step
+        cells = self._cells
+        size = self.size
+        _, edge, weight = square_features(size)
+        _, lines = square_geometry(size)
+        opponent_color = 'W' if player_color == 'B' else 'B'
+        h = self.hash
+        bits = 0
+        edges = 0
+        positional = 0
+        changed = 0
+        for r, c in squares:
+            cells[r][c] = player_color
+            index = r * size + c
+            bits |= 1 << index
+            h ^= ZOBRIST_FLIP[index]
+            edges += edge[index]
+            positional += weight[index]
+            changed |= lines[index]
+        self._invalidate(changed)
+        # Corners can never be flipped
+        count = len(squares)
+        self.hash = h
+        self.black ^= bits
+        self.white ^= bits
+        self.discs[player_color] += count
+        self.discs[opponent_color] -= count
+        self.edges[player_color] += edges
+        self.edges[opponent_color] -= edges
+        self.positional[player_color] += positional
+        self.positional[opponent_color] -= positional
 
-            if 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player_color:
-                for rr, cc in flip_positions:
-                    self.board[rr][cc] = player_color
+    def _set_square(self, row, col, disc, sign):
+        # Add (sign=1) or remove (sign=-1) a disc on an empty/occupied square
+        corner, edge, weight = square_features(self.size)
+        index = row * self.size + col
+        self._cells[row][col] = disc if sign > 0 else None
+        self.hash ^= ZOBRIST[disc][index]
+        if disc == 'B':
+            self.black ^= 1 << index
+        else:
+            self.white ^= 1 << index
+        self.discs[disc] += sign
+        self.corners[disc] += sign * corner[index]
+        self.edges[disc] += sign * edge[index]
+        self.positional[disc] += sign * weight[index]
+
+        neighbours, lines = square_geometry(self.size)
+        occupied = self.black | self.white
+        if sign > 0:
+            self.frontier = (self.frontier | neighbours[index]) & ~occupied
+        else:
+            if neighbours[index] & occupied:
+                self.frontier |= 1 << index
+            # Empty neighbours that were only next to this disc leave the frontier
+            check = neighbours[index] & self.frontier
+            while check:
+                low = check & -check
+                if not neighbours[low.bit_length() - 1] & occupied:
+                    self.frontier ^= low
+                check ^= low
+        self._invalidate(lines[index])
+
+    def make_move(self, row, col, player_color):
+        # Place a disc in place and return an undo record, or None if the move is invalid
+        if self._cells[row][col] is not None:
+            return None
+        flipped = self._bracketed(row, col, player_color)
+        if not flipped:
+            return None
+        self._set_square(row, col, player_color, 1)
+        self._flip(flipped, player_color)
+        return (row, col), flipped
+
+    def unmake_move(self, record):
+        # Restore the position from before the make_move that returned `record`
+        (row, col), flipped = record
+        player_color = self._cells[row][col]
+        self._flip(flipped, 'W' if player_color == 'B' else 'B')
+        self._set_square(row, col, player_color, -1)
 
     def is_full(self):
         # Check if the board is full
-        return all(all(cell is not None for cell in row) for row in self.board)
+        return self.discs['B'] + self.discs['W'] == self.size * self.size
 
     def get_score(self):
         # Return the score as a tuple (B_score, W_score)
-        B_score = sum(row.count('B') for row in self.board)
-        W_score = sum(row.count('W') for row in self.board)
-        return B_score, W_score
-    
+        return self.discs['B'], self.discs['W']
+
     def copy(self):
         """Create a copy of the current board state."""
-        new_board = Board(self.size)
-        new_board.board = [row[:] for row in self.board]  # Deep copy of the board
+        new_board = Board.__new__(Board)
+        new_board.size = self.size
+        new_board._cells = [row[:] for row in self._cells]  # Deep copy of the board
+        new_board.hash = self.hash
+        new_board.black = self.black
+        new_board.white = self.white
+        new_board.discs = self.discs.copy()
+        new_board.corners = self.corners.copy()
+        new_board.edges = self.edges.copy()
+        new_board.positional = self.positional.copy()
+        new_board.frontier = self.frontier
+        new_board._legal = self._legal.copy()
+        new_board._dirty = self._dirty.copy()
+        new_board._moves = self._moves.copy()
         return new_board
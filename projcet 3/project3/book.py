@@ -0,0 +1,193 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import FULL, BitBoard, flips_mask, hash_masks, legal_moves_mask
+from minimax import NegamaxSearch
+from transposition import TranspositionTable
+
+MAGIC = b'OBK1'
+HEADER = struct.Struct('<4sI')  # magic, entry count
+# Canonical position key, best move square (-1 for a pass), score for the side to move, search depth
+ENTRY = struct.Struct('<QbhB')
+NO_MOVE = -1
+
+
+def flip_vertical(mask):
+    # Row r to row 7 - r
+    return int.from_bytes(mask.to_bytes(8, 'little'), 'big')
+
+
+def mirror_horizontal(mask):
+    # Column c to column 7 - c
+    mask = ((mask >> 1) & 0x5555555555555555) | ((mask & 0x5555555555555555) << 1)
+    mask = ((mask >> 2) & 0x3333333333333333) | ((mask & 0x3333333333333333) << 2)
+    return ((mask >> 4) & 0x0F0F0F0F0F0F0F0F) | ((mask & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def flip_diagonal(mask):
+    # (row, col) to (col, row)
+    t = 0x0F0F0F0F00000000 & (mask ^ (mask << 28))
+    mask ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (mask ^ (mask << 14))
+    mask ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (mask ^ (mask << 7))
+    mask ^= t ^ (t >> 7)
+    return mask & FULL
+
+
+def transform(mask, symmetry):
+    # One of the 8 board symmetries: bit 0 mirrors, bit 1 flips, bit 2 transposes
+    if symmetry & 4:
+        mask = flip_diagonal(mask)
+    if symmetry & 2:
+        mask = flip_vertical(mask)
+    if symmetry & 1:
+        mask = mirror_horizontal(mask)
+    return mask
+
+
+# SQUARE_MAP[symmetry][square] is where the symmetry sends the square, INVERSE_MAP the way back
+SQUARE_MAP = [[transform(1 << square, symmetry).bit_length() - 1 for square in range(64)] for symmetry in range(8)]
+INVERSE_MAP = [[SQUARE_MAP[symmetry].index(square) for square in range(64)] for symmetry in range(8)]
+
+
+def canonical(own, opp):
+    """(key, symmetry, own, opp) of the symmetric variant with the smallest key.
+
+    Positions are stored from the side to move's point of view, so the same
+    entry serves both colours.
+    """
+    best = None
+    for symmetry in range(8):
+        own_t, opp_t = transform(own, symmetry), transform(opp, symmetry)
+        key = hash_masks(own_t, opp_t)
+        if best is None or key < best[0]:
+            best = (key, symmetry, own_t, opp_t)
+    return best
+
+
+def _search(task):
+    # Best move and score of one canonical position, side to move as black
+    own, opp, depth = task
+    move, score, reached = NegamaxSearch(TranspositionTable()).iterate(BitBoard.from_masks(own, opp), 'B', depth)
+    square = NO_MOVE if move is None else move[0] * 8 + move[1]
+    return square, int(max(-32768, min(32767, score))), reached
+
+
+def expand(plies):
+    # Canonical (own, opp) of every position up to `plies` moves from the start, keyed by canonical key
+    start = BitBoard()
+    key, _, own, opp = canonical(start.black, start.white)
+    positions = {key: (own, opp)}
+    level = dict(positions)
+    for _ in range(plies):
+        following = {}
+        for own, opp in level.values():
+            moves = legal_moves_mask(own, opp)
+            children = []
+            if not moves:
+                if legal_moves_mask(opp, own):
+                    children.append((opp, own))
+            while moves:
+                move = moves & -moves
+                moves ^= move
+                flips = flips_mask(own, opp, move)
+                children.append((opp ^ flips, own | move | flips))
+            for child_own, child_opp in children:
+                key, _, child_own, child_opp = canonical(child_own, child_opp)
+                if key not in positions:
+                    positions[key] = following[key] = (child_own, child_opp)
+        level = following
+    return positions
+
+
+def build(path, plies, depth, workers=None):
+    """Search every position of the first `plies` moves to `depth` and write the book to `path`."""
+    positions = expand(plies)
+    keys = sorted(positions)
+    tasks = [positions[key] + (depth,) for key in keys]
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_search, tasks, chunksize=16))
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(keys)))
+        for key, (square, score, reached) in zip(keys, results):
+            handle.write(ENTRY.pack(key, square, score, reached))
+    return len(keys)
+
+
+class OpeningBook:
+    """Read-only view of a book file, memory-mapped and searched by binary search."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(self._map, HEADER.size + middle * ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def lookup(self, board, color):
+        """(move, score, depth) for the side to move, or None if the position is not in the book.
+
+        The move is None when the side to move has to pass.
+        """
+        own, opp = (board.black, board.white) if color == 'B' else (board.white, board.black)
+        key, symmetry, _, _ = canonical(own, opp)
+        entry = self._find(key)
+        if entry is None:
+            return None
+        _, square, score, depth = entry
+        if square == NO_MOVE:
+            return None, score, depth
+        return divmod(INVERSE_MAP[symmetry][square], 8), score, depth
+
+    def move(self, board, color):
+        # Book move for `color`, or None when there is none to play
+        entry = self.lookup(board, color)
+        return None if entry is None else entry[0]
+
+
+def open_book(book):
+    # Players accept a path or an OpeningBook
+    return OpeningBook(book) if isinstance(book, (str, os.PathLike)) else book
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a symmetry-reduced opening book.")
+    parser.add_argument("--plies", type=int, default=6, help="every position up to this many moves from the start")
+    parser.add_argument("--depth", type=int, default=6, help="search depth of each position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="book.bin")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build(args.output, args.plies, args.depth, args.workers)
+    print(f"{count} positions to depth {args.depth} in {time.perf_counter() - start:.1f}s, "
+          f"{os.path.getsize(args.output)} bytes written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import time
+
+from bitboard import CORNERS, SQUARE_VALUES, legal_moves_mask
+from rollout import _flips
+
+# Scores are final disc differences (own discs minus opponent discs, empty squares
+# counted for nobody, as in Board.get_score) and lie strictly between -WIPEOUT and WIPEOUT
+WIPEOUT = 65
+# Above this many empties moves are ordered fastest-first (fewest opponent replies);
+# at or below it by parity, moves into quadrants with an odd number of empties first
+PARITY_EMPTIES = 6
+
+BITS = [1 << square for square in range(64)]
+# Quadrant of each square as one bit of a 4-bit parity mask
+QUADRANT = [1 << (((square >> 5) << 1) | ((square & 7) >> 2)) for square in range(64)]
+HEAD = 64  # sentinel of the circular list of empty squares
+
+
+def empties(board):
+    return 64 - (board.black | board.white).bit_count()
+
+
+class EndgameSolver:
+    """Exact endgame search on bitboards.
+
+    A win/loss/draw search with a null window around zero runs first, then an
+    exact search inside the window it leaves. The empty squares are kept in a
+    doubly linked list in static square order, so nodes walk only the empties
+    instead of the whole board. The last three empties have their own routines.
+
+    `solve` returns the best move and its disc difference; ties go to the
+    lowest (row, col). `stats` describes the last solve.
+    """
+
+    def __init__(self, parity_empties=PARITY_EMPTIES):
+        self.parity_empties = parity_empties
+        self.nodes = 0
+        self.stats = None
+        self.next = [HEAD] * 65
+        self.prev = [HEAD] * 65
+
+    def _link(self, empty):
+        # Empty squares best first, so the parity pass tries corners before X-squares
+        squares = sorted((square for square in range(64) if empty & BITS[square]),
+                         key=lambda square: (-SQUARE_VALUES[square], square))
+        previous = HEAD
+        for square in squares:
+            self.next[previous] = square
+            self.prev[square] = previous
+            previous = square
+        self.next[previous] = HEAD
+        self.prev[HEAD] = previous
+        parity = 0
+        for square in squares:
+            parity ^= QUADRANT[square]
+        return len(squares), parity
+
+    def solve(self, board, color, wld_only=False):
+        """(move, score) for `color` with perfect play, or (None, score) if it has to pass.
+
+        With `wld_only` the score is only the sign of the result: 1, 0 or -1.
+        """
+        start = time.perf_counter()
+        own, opp = (board.black, board.white) if color == 'B' else (board.white, board.black)
+        count, parity = self._link(~(own | opp) & 0xFFFFFFFFFFFFFFFF)
+        self.nodes = 0
+        square, wld = self._root(own, opp, -1, 1, count, parity, False)
+        if not wld_only:
+            # The exact score lies strictly inside the half the WLD search proved
+            alpha, beta = (0, WIPEOUT) if wld > 0 else (-WIPEOUT, 0) if wld < 0 else (-1, 1)
+            square, score = self._root(own, opp, alpha, beta, count, parity, True)
+        else:
+            score = (wld > 0) - (wld < 0)
+        self.stats = {
+            'empties': count,
+            'score': score,
+            'wld': (wld > 0) - (wld < 0),
+            'nodes': self.nodes,
+            'seconds': time.perf_counter() - start,
+        }
+        return (None if square is None else divmod(square, 8)), score
+
+    def _root(self, own, opp, alpha, beta, count, parity, exact):
+        moves = self._moves(own, opp, count, parity)
+        if not moves:
+            score = -self._search(opp, own, -beta, -alpha, count, parity, True)
+            return None, score
+        next_, prev = self.next, self.prev
+        best_square, best_score = None, -WIPEOUT
+        for _, square, flips in moves:
+            # In the exact pass a move tying the best is searched exactly too, so
+            # ties go to the lowest square instead of the first one ordered
+            low = max(alpha, best_score - 1 if exact else best_score)
+            before, after = prev[square], next_[square]
+            next_[before] = after
+            prev[after] = before
+            score = -self._search(opp ^ flips, own | BITS[square] | flips, -beta, -low, count - 1,
+                                  parity ^ QUADRANT[square])
+            next_[before] = square
+            prev[after] = square
+            if score > best_score or (score == best_score and square < best_square):
+                best_square, best_score = square, score
+                if score >= beta:
+                    break
+        return best_square, best_score
+
+    def _moves(self, own, opp, count, parity):
+        # (key, square, flips) of every legal move, in search order
+        next_ = self.next
+        moves = []
+        if count > self.parity_empties:
+            square = next_[HEAD]
+            while square != HEAD:
+                flips = _flips(own, opp, square)
+                if flips:
+                    # Fastest-first: fewest replies for the opponent, corners breaking ties
+                    replies = legal_moves_mask(opp ^ flips, own | BITS[square] | flips).bit_count()
+                    moves.append((2 * replies - (BITS[square] & CORNERS != 0), square, flips))
+                square = next_[square]
+            moves.sort()
+        else:
+            for odd in (True, False):
+                square = next_[HEAD]
+                while square != HEAD:
+                    if bool(parity & QUADRANT[square]) == odd:
+                        flips = _flips(own, opp, square)
+                        if flips:
+                            moves.append((0, square, flips))
+                    square = next_[square]
+        return moves
+
+    def _search(self, own, opp, alpha, beta, count, parity, passed=False):
+        # Fail-soft negamax with principal-variation windows; `passed` means the
+        # opponent could not move either, so having no move ends the game
+        next_ = self.next
+        if count <= 3:
+            if count == 3:
+                first = next_[HEAD]
+                second = next_[first]
+                third = next_[second]
+                # Parity for three squares: the one alone in its quadrant first
+                if QUADRANT[first] == QUADRANT[second]:
+                    first, third = third, first
+                elif QUADRANT[first] == QUADRANT[third]:
+                    first, second = second, first
+                return self._last3(own, opp, alpha, beta, first, second, third)
+            if count == 2:
+                first = next_[HEAD]
+                return self._last2(own, opp, alpha, beta, first, next_[first])
+            if count == 1:
+                return self._last1(own, opp, next_[HEAD])
+            self.nodes += 1
+            return own.bit_count() - opp.bit_count()
+
+        self.nodes += 1
+        moves = self._moves(own, opp, count, parity)
+        if not moves:
+            if passed:
+                return own.bit_count() - opp.bit_count()
+            return -self._search(opp, own, -beta, -alpha, count, parity, True)
+
+        prev = self.prev
+        best = -WIPEOUT
+        for i, (_, square, flips) in enumerate(moves):
+            before, after = prev[square], next_[square]
+            next_[before] = after
+            prev[after] = before
+            child_own, child_opp = opp ^ flips, own | BITS[square] | flips
+            child_parity = parity ^ QUADRANT[square]
+            if i == 0:
+                score = -self._search(child_own, child_opp, -beta, -alpha, count - 1, child_parity)
+            else:
+                score = -self._search(child_own, child_opp, -alpha - 1, -alpha, count - 1, child_parity)
+                if alpha < score < beta:
+                    score = -self._search(child_own, child_opp, -beta, -score, count - 1, child_parity)
+            next_[before] = square
+            prev[after] = square
+            if score > best:
+                best = score
+                if score >= beta:
+                    break
+                if score > alpha:
+                    alpha = score
+        return best
+
+    def _last3(self, own, opp, alpha, beta, first, second, third, passed=False):
+        self.nodes += 1
+        best = -WIPEOUT
+        for square, x, y in ((first, second, third), (second, first, third), (third, first, second)):
+            flips = _flips(own, opp, square)
+            if flips:
+                score = -self._last2(opp ^ flips, own | BITS[square] | flips, -beta, -max(alpha, best), x, y)
+                if score > best:
+                    best = score
+                    if score >= beta:
+                        return best
+        if best > -WIPEOUT:
+            return best
+        if passed:
+            return own.bit_count() - opp.bit_count()
+        return -self._last3(opp, own, -beta, -alpha, first, second, third, True)
+
+    def _last2(self, own, opp, alpha, beta, first, second, passed=False):
+        self.nodes += 1
+        best = -WIPEOUT
+        flips = _flips(own, opp, first)
+        if flips:
+            best = -self._last1(opp ^ flips, own | BITS[first] | flips, second)
+            if best >= beta:
+                return best
+        flips = _flips(own, opp, second)
+        if flips:
+            score = -self._last1(opp ^ flips, own | BITS[second] | flips, first)
+            if score > best:
+                best = score
+        if best > -WIPEOUT:
+            return best
+        if passed:
+            return own.bit_count() - opp.bit_count()
+        return -self._last2(opp, own, -beta, -alpha, first, second, True)
+
+    def _last1(self, own, opp, square):
+        # The last empty square: whoever can play it does, the side to move first
+        self.nodes += 1
+        flips = _flips(own, opp, square)
+        if flips:
+            return 2 * (own.bit_count() + flips.bit_count()) - 62
+        flips = _flips(opp, own, square)
+        if flips:
+            return 2 * (own.bit_count() - flips.bit_count()) - 64
+        return own.bit_count() - opp.bit_count()
@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
+from bitboard import BitBoard
+from book import OpeningBook
+from endgame import EndgameSolver, empties
+from expectimax import expectimax
+from mcts import BLACK, PASS, WHITE, MCTSTree
+from minimax import NegamaxSearch
+from patterns import PatternEvaluator
+from perft import board_from_text, board_to_text
+from searchstats import SearchStats
+from transposition import TranspositionTable
+from verify import move_from_text, move_to_text
+
+# Option name -> (type, default); set with `setoption <name> <value>`
+OPTIONS = {
+    'engine': (str, 'minimax'),  # minimax, expectimax or mcts
+    'tt': (int, 1 << 20),  # transposition table / expectimax cache slots
+    'book': (str, ''),  # opening book file, empty for none
+    'endgame': (int, 0),  # solve exactly at this many empty squares or fewer, 0 for never
+    'eval': (str, ''),  # pattern table for minimax and expectimax, empty for evaluate_board
+    'pruning': (bool, False),  # Star1/Star2 pruning for expectimax
+    'exploration': (float, 1.4),
+    'selection': (str, 'uct'),
+    'leaf': (int, 1),  # MCTS leaf playouts
+    'seed': (int, 42),
+}
+ENGINES = ('minimax', 'expectimax', 'mcts')
+# Options whose change rebuilds the state they feed
+REBUILDS = {'tt': '_build_tables', 'eval': '_build_tables', 'book': '_build_book', 'exploration': '_build_tree', 'selection': '_build_tree',
+            'leaf': '_build_tree', 'seed': '_build_tree'}
+
+HELP = """commands, optionally prefixed with @<id> to tag every reply line with that id:
+  position start|<64 squares of B, W or .> [B|W] [moves e3 f4 -- ...]
+  go [depth N] [time MS] [sims N]     search the position (sims and time for mcts); with no
+                                      limit the search runs until stop
+  stop                                end the running search and those queued before the stop,
+                                      which still answer bestmove
+  setoption <name> <value>            options: """ + ', '.join(OPTIONS) + """
+  stats                               JSON record of the last search and the tables
+  isready                             answers readyok once everything queued before it is done
+  help, quit"""
+
+
+def _parse_bool(text):
+    return text.lower() in ('1', 'true', 'on', 'yes')
+
+
+def parse_position(tokens):
+    # (board, color to move) from the arguments of a position command
+    if not tokens:
+        raise ValueError("position needs 'start' or a board")
+    if tokens[0] == 'start':
+        board = BitBoard()
+    elif len(tokens[0]) == 64 and set(tokens[0]) <= set('BW.'):
+        board = BitBoard.from_board(board_from_text(tokens[0]))
+    else:
+        raise ValueError(f"bad board {tokens[0]!r}")
+    color = 'B'
+    rest = tokens[1:]
+    if rest and rest[0] in ('B', 'W'):
+        color, rest = rest[0], rest[1:]
+    if rest:
+        if rest[0] != 'moves':
+            raise ValueError(f"expected 'moves', got {rest[0]!r}")
+        for text in rest[1:]:
+            move = move_from_text(text)
+            if move is not None and not board.place_disc(move[0], move[1], color):
+                raise ValueError(f"illegal move {text}")
+            color = 'W' if color == 'B' else 'B'
+    return board, color
+
+
+def parse_limits(tokens):
+    # {'depth': N, 'time': MS, 'sims': N} from the arguments of a go command
+    limits = {}
+    for key, value in zip(tokens[::2], tokens[1::2]):
+        if key not in ('depth', 'time', 'sims'):
+            raise ValueError(f"unknown go limit {key!r}")
+        limits[key] = int(value)
+    if len(tokens) % 2:
+        raise ValueError(f"go limit {tokens[-1]!r} needs a value")
+    return limits
+
+
+class Engine:
+    """Long-lived search engine behind the line protocol.
+
+    The transposition tables, killer and history tables, the MCTS tree,
+    the opening book and the endgame solver all live as long as the engine,
+    so later searches start warm. `emit` receives every reply line and may
+    be called from the search thread.
+    """
+
+    def __init__(self, emit=print):
+        self.emit = emit
+        self.options = {name: default for name, (_, default) in OPTIONS.items()}
+        self.board = BitBoard()
+        self.color = 'B'
+        self.last = None
+        self.searches = 0
+        self._running = None  # object whose stop() ends the running search
+        self._pending = set()  # stop events of the searches queued or running
+        self.solver = EndgameSolver()
+        self._build_tables()
+        self._build_book()
+        self._build_tree()
+
+    def _build_tables(self):
+        # Scores cached under one evaluator mean nothing to another, so the tables go with it
+        self.evaluator = PatternEvaluator(self.options['eval']) if self.options['eval'] else None
+        self.tt = TranspositionTable(self.options['tt'])
+        self.search = NegamaxSearch(self.tt, evaluator=self.evaluator)
+        self.cache = TranspositionTable(self.options['tt'])
+
+    def _build_book(self):
+        self.book = OpeningBook(self.options['book']) if self.options['book'] else None
+
+    def _build_tree(self):
+        self.tree = MCTSTree(self.options['exploration'], self.options['selection'],
+                             rng=random.Random(self.options['seed']), leaf_playouts=self.options['leaf'])
+
+    def set_option(self, name, value):
+        if name not in OPTIONS:
+            raise ValueError(f"unknown option {name!r}, expected one of {', '.join(OPTIONS)}")
+        kind = OPTIONS[name][0]
+        value = _parse_bool(value) if kind is bool else kind(value)
+        if name == 'engine' and value not in ENGINES:
+            raise ValueError(f"unknown engine {value!r}, expected one of {', '.join(ENGINES)}")
+        if name == 'tt' and value <= 0:
+            raise ValueError("tt needs at least one slot")
+        previous, self.options[name] = self.options[name], value
+        if name in REBUILDS:
+            try:
+                getattr(self, REBUILDS[name])()
+            except (ValueError, OSError):
+                self.options[name] = previous  # a file that does not load leaves the old one in use
+                raise
+
+    def set_position(self, tokens):
+        self.board, self.color = parse_position(tokens)
+
+    def stop(self):
+        # Ends the running search and every search queued before the stop
+        for stop in tuple(self._pending):
+            stop.set()
+        running = self._running
+        if running is not None:
+            running.stop()
+
+    def stats(self):
+        return {
+            'last': self.last,
+            'searches': self.searches,
+            'position': [board_to_text(self.board), self.color],
+            'options': self.options,
+            'tt': self.tt.stats(),
+            'mcts_nodes': len(self.tree),
+            'book_positions': len(self.book) if self.book is not None else 0,
+        }
+
+    def go(self, board, color, limits, tag='', stop=None):
+        """Search `board` for `color` within `limits` and emit info lines and a bestmove line.
+
+        `stop` is the event stop() sets for this search, which may be before it starts.
+        """
+        stop = stop or threading.Event()
+        self._pending.add(stop)
+        try:
+            self._go(board, color, limits, tag, stop)
+        finally:
+            self._pending.discard(stop)
+
+    def _go(self, board, color, limits, tag, stop):
+        self.searches += 1
+        stats = SearchStats()
+        engine = self.options['engine']
+        depth = score = None
+        source = engine
+        entry = self.book.lookup(board, color) if self.book is not None else None
+        if not board.get_valid_moves(color):
+            move, source = None, 'pass'
+        elif entry is not None and entry[0] is not None:
+            move, score, depth = entry
+            source = 'book'
+        elif self.options['endgame'] and empties(board) <= self.options['endgame']:
+            move, score = self.solver.solve(board, color)
+            stats.nodes = self.solver.stats['nodes']
+            depth = self.solver.stats['empties']
+            source = 'endgame'
+        elif engine == 'minimax':
+            move, score, depth = self._minimax(board, color, limits, stats, tag, stop)
+        elif engine == 'expectimax':
+            move, score, depth = self._expectimax(board, color, limits, stats, stop)
+        else:
+            move, score = self._mcts(board, color, limits, stats, stop)
+        cache = self.tt if source == 'minimax' else self.cache if source == 'expectimax' else None
+        self.last = stats.finish(source, color, move, cache, score=score, depth=depth)
+        reply = f"{tag}bestmove {move_to_text(move)}"
+        if score is not None:
+            reply += f" score {score:g}"
+        if depth is not None:
+            reply += f" depth {depth}"
+        self.emit(f"{reply} nodes {stats.nodes} ms {1000 * self.last['seconds']:.0f} source {source}")
+
+    def _deadline(self, limits):
+        return time.perf_counter() + limits['time'] / 1000 if 'time' in limits else None
+
+    def _publish(self, search, stop):
+        # Make `search` the one stop() reaches; a stop() that came before it still counts
+        search.stopped = False
+        self._running = search
+        if stop.is_set():
+            search.stop()
+
+    def _minimax(self, board, color, limits, stats, tag, stop):
+        search = self.search
+        search.stats = stats
+
+        def progress(move, score, depth, nodes):
+            self.emit(f"{tag}info depth {depth} score {score:g} move {move_to_text(move)} nodes {stats.nodes}")
+        search.progress = progress
+        self.tt.new_search()
+        self._publish(search, stop)
+        try:
+            return search.iterate(board, color, limits.get('depth', 64), self._deadline(limits))
+        finally:
+            self._running = None
+            search.stats = search.progress = None
+
+    def _expectimax(self, board, color, limits, stats, stop):
+        # A depth limit alone is one search at that depth; with a time limit the depth
+        # grows until the time is up or stop() arrives between iterations
+        if self.cache is not None:
+            self.cache.new_search()
+        deadline = self._deadline(limits)
+        pruning = self.options['pruning']
+        cache = self.cache if pruning else None
+        if deadline is None and 'depth' in limits:
+            stats.start_depth(limits['depth'])
+            move, value = expectimax(board.copy(), limits['depth'], True, color, pruning=pruning, cache=cache,
+                                     stats=stats, evaluator=self.evaluator)
+            stats.end_depth()
+            return move, value, limits['depth']
+        result = (None, None, 0)
+        for depth in range(1, min(limits.get('depth', 64), empties(board)) + 1):
+            if depth > 1 and (stop.is_set() or (deadline is not None and time.perf_counter() >= deadline)):
+                break
+            stats.start_depth(depth)
+            move, value = expectimax(board.copy(), depth, True, color, pruning=pruning, cache=cache, stats=stats,
+                                     evaluator=self.evaluator)
+            stats.end_depth()
+            result = (move, value, depth)
+        return result
+
+    def _mcts(self, board, color, limits, stats, stop):
+        # Limited by sims and time only; the score is the chosen move's win rate in percent
+        tree = self.tree
+        tree.set_root(board.black, board.white, BLACK if color == 'B' else WHITE)
+        size, playouts = len(tree), tree.playouts
+        self._publish(tree, stop)
+        try:
+            tree.search(limits.get('sims'), limits.get('time'))
+        finally:
+            self._running = None
+        stats.nodes = len(tree) - size
+        stats.playouts = stats.leaves = tree.playouts - playouts
+        return self._mcts_result(tree)
+
+    def _mcts_result(self, tree):
+        square = tree.best_move()
+        if square is None or square == PASS:
+            return None, None
+        for move, visits, wins in tree.root_stats():
+            if move == square:
+                return divmod(square, 8), round(100 * wins / visits, 1) if visits else None
+        return divmod(square, 8), None
+
+    def handle(self, line, run_search=None):
+        """Run one protocol line; returns False on quit.
+
+        Searches go to `run_search(job)` when it is given (the asynchronous server
+        queues them) and run right away otherwise.
+        """
+        tag = ''
+        tokens = line.split()
+        if tokens and tokens[0].startswith('@'):
+            tag = tokens[0] + ' '
+            tokens = tokens[1:]
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        try:
+            if command == 'quit':
+                self.stop()
+                return False
+            if command == 'position':
+                self.set_position(args)
+            elif command == 'go':
+                limits = parse_limits(args)
+                board, color = self.board.copy(), self.color
+                stop = threading.Event()
+                self._pending.add(stop)  # a stop before the search starts still ends it
+                job = lambda: self._guard(tag, self.go, board, color, limits, tag, stop)
+                (run_search or (lambda job: job()))(job)
+            elif command == 'stop':
+                self.stop()
+            elif command == 'setoption':
+                if len(args) != 2:
+                    raise ValueError("usage: setoption <name> <value>")
+                job = lambda: self._guard(tag, self.set_option, *args)
+                (run_search or (lambda job: job()))(job)
+            elif command == 'stats':
+                self.emit(f"{tag}stats {json.dumps(self.stats())}")
+            elif command == 'isready':
+                job = lambda: self.emit(f"{tag}readyok")
+                (run_search or (lambda job: job()))(job)
+            elif command == 'help':
+                for help_line in HELP.splitlines():
+                    self.emit(f"{tag}{help_line}")
+            else:
+                raise ValueError(f"unknown command {command!r}")
+        except (ValueError, OSError) as error:
+            self.emit(f"{tag}error {error}")
+        return True
+
+    def _guard(self, tag, function, *args):
+        # Queued commands report their errors when they run; a failed search still
+        # leaves the engine answering the requests behind it
+        try:
+            function(*args)
+        except (ValueError, OSError) as error:
+            self.emit(f"{tag}error {error}")
+        except Exception as error:
+            self.emit(f"{tag}error {type(error).__name__}: {error}")
+
+
+def line_writer(stream=sys.stdout):
+    # emit() for one output stream, safe to call from the search thread
+    lock = threading.Lock()
+
+    def emit(line):
+        with lock:
+            stream.write(line + '\n')
+            stream.flush()
+    return emit
+
+
+def serve_sync(engine, lines=sys.stdin):
+    # One request after another: each search finishes before the next line is read
+    for line in lines:
+        if not engine.handle(line):
+            break
+
+
+async def serve(engine, lines=sys.stdin):
+    """Read requests while searching: searches, setoption and isready run in order on a
+    worker thread, while position, stop and stats are answered as soon as they arrive."""
+    loop = asyncio.get_running_loop()
+    jobs = asyncio.Queue()
+
+    async def worker():
+        while True:
+            job = await jobs.get()
+            try:
+                await asyncio.to_thread(job)
+            except Exception as error:  # the jobs report their own errors; this keeps the worker alive
+                engine.emit(f"error {type(error).__name__}: {error}")
+            finally:
+                jobs.task_done()
+
+    worker_task = asyncio.create_task(worker())
+    while True:
+        # Read on a thread: stdin may be a file, which the event loop cannot watch
+        line = await loop.run_in_executor(None, lines.readline)
+        # End of input or quit (which stops the searches): answer everything already asked
+        if not line or not engine.handle(line, jobs.put_nowait):
+            await jobs.join()
+            break
+    worker_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Othello engine speaking a line protocol on stdin/stdout; send 'help' for the commands.")
+    parser.add_argument("--sync", action="store_true", help="handle one request at a time, without asyncio")
+    for name, (kind, default) in OPTIONS.items():
+        parser.add_argument(f"--{name}", type=_parse_bool if kind is bool else kind, default=default)
+    args = parser.parse_args()
+
+    engine = Engine(line_writer())
+    try:
+        for name in OPTIONS:
+            if getattr(args, name) != engine.options[name]:
+                engine.set_option(name, str(getattr(args, name)))
+    except (ValueError, OSError) as error:
+        parser.error(str(error))
+    if args.sync:
+        serve_sync(engine)
+    else:
+        asyncio.run(serve(engine))
+
+
+if __name__ == "__main__":
+    main()
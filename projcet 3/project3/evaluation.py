@@ -0,0 +1,235 @@
+from collections import namedtuple
+
+from bitboard import FULL, LEFT_SHIFTS, NOT_A_FILE, NOT_H_FILE, RIGHT_SHIFTS, legal_moves_mask, square_bit
+from stability import AXIS_LINES, A_FILE, BOTTOM_ROW, H_FILE, TOP_ROW, stable_counts, stable_masks
+
+try:
+    import numpy as np
+except ImportError:  # only the batched evaluator needs numpy
+    np = None
+
+# Weight of each heuristic term; every term is a (player - opponent) difference
+Weights = namedtuple('Weights', ['discs', 'corners', 'edges', 'mobility', 'stability'])
+
+DEFAULT_WEIGHTS = Weights(discs=1, corners=25, edges=5, mobility=10, stability=15)
+
+# IntelligentPlayer scores its own disc count plus 25 per corner and 5 per move of
+# mobility. Doubling that and subtracting the (same for every candidate) disc total
+# gives these weights, so its moves rank exactly as before.
+INTELLIGENT_WEIGHTS = Weights(discs=1, corners=50, edges=0, mobility=10, stability=0)
+
+# Array encoding used by the batched evaluator
+EMPTY, BLACK, WHITE = 0, 1, -1
+
+
+def evaluate_board(board, player_color, weights=DEFAULT_WEIGHTS):
+    # Disc, corner and edge counts are kept up to date by the board itself;
+    # only mobility and stability are computed here
+    opponent_color = 'W' if player_color == 'B' else 'B'
+    discs, corners, edges = board.discs, board.corners, board.edges
+
+    score = weights.discs * (discs[player_color] - discs[opponent_color])
+
+    # Calculate corner advantage
+    score += weights.corners * (corners[player_color] - corners[opponent_color])
+
+    # Calculate edge control
+    if weights.edges:
+        score += weights.edges * (edges[player_color] - edges[opponent_color])
+
+    # Calculate mobility
+    if weights.mobility:
+        player_moves = len(board.get_valid_moves(player_color))
+        opponent_moves = len(board.get_valid_moves(opponent_color))
+        score += weights.mobility * (player_moves - opponent_moves)
+
+    # Calculate stable discs
+    if weights.stability:
+        B_stable, W_stable = stable_counts(board)
+        if player_color == 'B':
+            score += weights.stability * (B_stable - W_stable)
+        else:
+            score += weights.stability * (W_stable - B_stable)
+
+    return score
+
+
+def evaluate_preview(board, player_color, row, col, preview, weights=DEFAULT_WEIGHTS):
+    # evaluate_board of the position after `player_color` plays (row, col), worked out from
+    # the move's MovePreview without playing it
+    opponent_color = 'W' if player_color == 'B' else 'B'
+    own_discs, opp_discs = (preview.black, preview.white) if player_color == 'B' else (preview.white, preview.black)
+    score = weights.discs * (own_discs - opp_discs)
+    score += weights.corners * (board.corners[player_color] - board.corners[opponent_color] + preview.corners)
+    if weights.edges:
+        score += weights.edges * (board.edges[player_color] - board.edges[opponent_color] + preview.edges)
+
+    if weights.mobility or weights.stability:
+        own, opp = (board.black, board.white) if player_color == 'B' else (board.white, board.black)
+        own |= square_bit(row, col) | preview.flips
+        opp ^= preview.flips
+        if weights.mobility:
+            score += weights.mobility * (legal_moves_mask(own, opp).bit_count() - legal_moves_mask(opp, own).bit_count())
+        if weights.stability:
+            own_stable, opp_stable = stable_masks(own, opp)
+            score += weights.stability * (own_stable.bit_count() - opp_stable.bit_count())
+    return score
+
+
+def score_bounds(weights=DEFAULT_WEIGHTS):
+    # (lowest, highest) score evaluate_board can return. With p own discs at most
+    # min(4, p) are corners, min(24, p) other edges and p stable, and neither side
+    # has more moves than the 64 - p empty squares.
+    bound = max(abs(weights.discs) * p + abs(weights.stability) * p + abs(weights.corners) * min(4, p)
+                + abs(weights.edges) * min(24, p) + abs(weights.mobility) * (64 - p)
+                for p in range(65))
+    return -bound, bound
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("the batched evaluator needs numpy (pip install numpy)")
+
+
+def board_to_array(board):
+    """(8, 8) int8 array of a Board or BitBoard: 1 black, -1 white, 0 empty."""
+    _require_numpy()
+    bits = np.arange(64, dtype=np.uint64)
+    black = (np.uint64(board.black) >> bits) & np.uint64(1)
+    white = (np.uint64(board.white) >> bits) & np.uint64(1)
+    return (black.astype(np.int8) - white.astype(np.int8)).reshape(8, 8)
+
+
+def boards_to_array(boards):
+    return np.stack([board_to_array(board) for board in boards])
+
+
+def pack(planes):
+    """Pack a boolean (N, 8, 8) array into (N,) uint64 masks, bit row * 8 + col."""
+    packed = np.packbits(planes.reshape(-1, 64), axis=1, bitorder='little')
+    return packed.view('<u8').reshape(-1).astype(np.uint64)
+
+
+def unpack(masks):
+    """Inverse of pack: (N,) uint64 masks to a boolean (N, 8, 8) array."""
+    as_bytes = np.ascontiguousarray(masks, dtype='<u8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1, bitorder='little').reshape(-1, 8, 8).astype(bool)
+
+
+def popcount(masks):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    return unpack(masks).sum(axis=(1, 2))
+
+
+def _u64(value):
+    return np.uint64(value)
+
+
+if np is not None:
+    _LEFT = [(_u64(shift), _u64(mask)) for shift, mask in LEFT_SHIFTS]
+    _RIGHT = [(_u64(shift), _u64(mask)) for shift, mask in RIGHT_SHIFTS]
+    _FULL = _u64(FULL)
+    _CORNERS = _u64(square_bit(0, 0) | square_bit(0, 7) | square_bit(7, 0) | square_bit(7, 7))
+    _EDGES = _u64(A_FILE | H_FILE | TOP_ROW | BOTTOM_ROW) & ~_CORNERS
+    _AXIS_LINES = [[_u64(line) for line in lines] for lines in AXIS_LINES]
+    _ONE, _SEVEN, _EIGHT, _NINE = _u64(1), _u64(7), _u64(8), _u64(9)
+    _A_FILE, _H_FILE, _NOT_A, _NOT_H = _u64(A_FILE), _u64(H_FILE), _u64(NOT_A_FILE), _u64(NOT_H_FILE)
+    _VERTICAL_EDGES = _u64(TOP_ROW | BOTTOM_ROW)
+    _ALL_EDGES = _u64(A_FILE | H_FILE | TOP_ROW | BOTTOM_ROW)
+
+
+def legal_moves(own, opp):
+    """Legal-move masks for every position, given (N,) uint64 masks; bitboard.legal_moves_mask vectorized."""
+    empty = ~(own | opp) & _FULL
+    moves = np.zeros_like(own)
+    for shift, mask in _LEFT:
+        run_mask = opp & mask
+        x = (own << shift) & run_mask
+        for _ in range(5):
+            x |= (x << shift) & run_mask
+        moves |= (x << shift) & mask & empty
+    for shift, mask in _RIGHT:
+        run_mask = opp & mask
+        x = (own >> shift) & run_mask
+        for _ in range(5):
+            x |= (x >> shift) & run_mask
+        moves |= (x >> shift) & mask & empty
+    return moves
+
+
+def flip_masks(own, opp, moves):
+    """Discs flipped by playing the single-bit masks `moves` (0 for none) in every position."""
+    flips = np.zeros_like(own)
+    for shifts, step in ((_LEFT, np.left_shift), (_RIGHT, np.right_shift)):
+        for shift, mask in shifts:
+            run_mask = opp & mask
+            x = step(moves, shift) & run_mask
+            for _ in range(5):
+                x |= step(x, shift) & run_mask
+            # A run of opponent discs is flipped when an own disc closes it
+            flips |= np.where(step(x, shift) & mask & own != 0, x, _u64(0))
+    return flips
+
+
+def stable_discs(black, white):
+    """Stable black and white discs for (N,) uint64 masks; stability.stable_masks vectorized."""
+    occupied = black | white
+    full = []
+    for lines in _AXIS_LINES:
+        axis_full = np.zeros_like(occupied)
+        for line in lines:
+            axis_full |= np.where(occupied & line == line, line, _u64(0))
+        full.append(axis_full)
+
+    stable = []
+    for own in (black, white):
+        known = np.zeros_like(own)
+        while True:
+            step = own & (full[0] | _A_FILE | _H_FILE | ((known << _ONE) & _NOT_A) | ((known >> _ONE) & _NOT_H))
+            step &= full[1] | _VERTICAL_EDGES | ((known << _EIGHT) & _FULL) | (known >> _EIGHT)
+            step &= full[2] | _ALL_EDGES | ((known << _NINE) & _NOT_A) | ((known >> _NINE) & _NOT_H)
+            step &= full[3] | _ALL_EDGES | ((known << _SEVEN) & _NOT_H) | ((known >> _SEVEN) & _NOT_A)
+            if np.array_equal(step, known):
+                break
+            known = step
+        stable.append(known)
+    return stable
+
+
+def evaluate_masks(black, white, sign, weights=DEFAULT_WEIGHTS):
+    """evaluate_board for (N,) uint64 black/white masks, from the side given by +1/-1 `sign`."""
+    _require_numpy()
+    black = np.asarray(black, dtype=np.uint64)
+    white = np.asarray(white, dtype=np.uint64)
+
+    def difference(black_term, white_term):
+        return sign * (black_term - white_term)
+
+    score = weights.discs * difference(popcount(black), popcount(white))
+    score += weights.corners * difference(popcount(black & _CORNERS), popcount(white & _CORNERS))
+    if weights.edges:
+        score += weights.edges * difference(popcount(black & _EDGES), popcount(white & _EDGES))
+    if weights.mobility:
+        score += weights.mobility * difference(popcount(legal_moves(black, white)),
+                                               popcount(legal_moves(white, black)))
+    if weights.stability:
+        stable_black, stable_white = stable_discs(black, white)
+        score += weights.stability * difference(popcount(stable_black), popcount(stable_white))
+    return score
+
+
+def evaluate_batch(positions, player_color, weights=DEFAULT_WEIGHTS):
+    """Score a stack of positions at once.
+
+    `positions` is an (N, 8, 8) int8 array (1 black, -1 white, 0 empty) and
+    `player_color` is 'B', 'W' or an (N,) array of +1/-1 for the side each score is
+    for. Returns N scores equal to evaluate_board on each position.
+    """
+    _require_numpy()
+    positions = np.asarray(positions, dtype=np.int8).reshape(-1, 8, 8)
+    if isinstance(player_color, str):
+        sign = np.full(len(positions), BLACK if player_color == 'B' else WHITE, dtype=np.int64)
+    else:
+        sign = np.asarray(player_color, dtype=np.int64)
+    return evaluate_masks(pack(positions == BLACK), pack(positions == WHITE), sign, weights)
@@ -1,92 +1,225 @@
-from board import Board
-import random
+from board import SQUARE_WEIGHTS
+from evaluation import DEFAULT_WEIGHTS, evaluate_board, evaluate_masks, np, score_bounds
+from transposition import EXACT, LOWER, UPPER
+from zobrist import position_key
 
-def expectimax(board, depth, maximizing_player, player_color):
-    if depth == 0 or (not board.get_valid_moves('B') and not board.get_valid_moves('W')):
-        return None, evaluate_board(board, player_color)
+INF = float('inf')
+# Every evaluate_board score lies in [LOW, HIGH], which is what makes Star1/Star2 cutoffs sound
+LOW, HIGH = score_bounds(DEFAULT_WEIGHTS)
+# Root moves only have to beat the best value by this much to be searched exactly, so exact ties
+# are still seen despite rounding in the chance-node windows
+ROOT_TIE_MARGIN = 1e-6
+
+def expectimax(board, depth, maximizing_player, player_color, batch_leaves=False, pruning=False, cache=None,
+               stats=None, evaluator=None):
+    # With batch_leaves the children of depth-1 nodes are scored in one evaluate_batch call.
+    # With pruning the search uses Star1/Star2 chance-node cutoffs, probe ordering at max nodes
+    # and an optional TranspositionTable `cache` of chance-node values; the value is the same.
+    # An optional SearchStats `stats` is filled in; its cutoffs are keyed by ply below the
+    # depth last given to stats.start_depth. `evaluator` replaces evaluate_board at the leaves and
+    # needs an evaluate_masks method and (low, high) `bounds` (a PatternEvaluator, for instance).
+    if pruning:
+        if maximizing_player:
+            return max_node(board, depth, player_color, -INF, INF, cache, root=True, stats=stats, evaluator=evaluator)
+        return None, chance_node(board, depth, player_color, -INF, INF, cache, stats, evaluator)
+
+    if stats is not None:
+        stats.nodes += 1
+    # A position where the side to move has moves is not terminal, and one where it has none
+    # is scored statically either way, so only the mover's moves are needed
+    if depth == 0:
+        return None, _evaluate(board, player_color, stats, evaluator)
 
     valid_moves = board.get_valid_moves(player_color if maximizing_player else ('W' if player_color == 'B' else 'B'))
     if not valid_moves:
-        return None, evaluate_board(board, player_color)
+        return None, _evaluate(board, player_color, stats, evaluator)
+    if stats is not None:
+        stats.expand(len(valid_moves))
+
+    if batch_leaves and depth == 1:
+        return score_leaves(board, valid_moves, maximizing_player, player_color, stats, evaluator)
 
     if maximizing_player:
         max_eval = -float('inf')
         best_move = None
         for move in valid_moves:
-            new_board = copy_board(board)
-            new_board.place_disc(move[0], move[1], player_color)
-            _, eval = expectimax(new_board, depth-1, False, player_color)
+            record = board.make_move(move[0], move[1], player_color)
+            _, eval = expectimax(board, depth-1, False, player_color, batch_leaves, stats=stats, evaluator=evaluator)
+            board.unmake_move(record)
             if eval > max_eval:
                 max_eval = eval
                 best_move = move
         return best_move, max_eval
     else:
         expected_value = 0
+        opponent_color = 'W' if player_color == 'B' else 'B'
         for move in valid_moves:
-            new_board = copy_board(board)
-            opponent_color = 'W' if player_color == 'B' else 'B'
-            new_board.place_disc(move[0], move[1], opponent_color)
-            _, eval = expectimax(new_board, depth-1, True, player_color)
+            record = board.make_move(move[0], move[1], opponent_color)
+            _, eval = expectimax(board, depth-1, True, player_color, batch_leaves, stats=stats, evaluator=evaluator)
+            board.unmake_move(record)
             expected_value += eval
         return None, expected_value / len(valid_moves)
 
-def evaluate_board(board, player_color):
-    B_score, W_score = board.get_score()
+def _evaluate(board, player_color, stats, evaluator=None):
+    evaluate = evaluate_board if evaluator is None else evaluator
+    if stats is not None:
+        return stats.evaluate(evaluate, board, player_color)
+    return evaluate(board, player_color)
+
+def _bounds(evaluator):
+    # Lowest and highest leaf score, for the Star1/Star2 windows
+    return (LOW, HIGH) if evaluator is None else evaluator.bounds
+
+def _cutoff(stats, depth):
+    if stats is not None:
+        stats.cutoff(stats.depth - depth)
+
+def score_leaves(board, moves, maximizing_player, player_color, stats=None, evaluator=None):
+    # Same result as recursing to depth 0 on every move, with one evaluator call
+    mover = player_color if maximizing_player else ('W' if player_color == 'B' else 'B')
+    black, white = [], []
+    for move in moves:
+        record = board.make_move(move[0], move[1], mover)
+        black.append(board.black)
+        white.append(board.white)
+        board.unmake_move(record)
+    sign = 1 if player_color == 'B' else -1
+    evaluate = evaluate_masks if evaluator is None else evaluator.evaluate_masks
+    if stats is not None:
+        stats.nodes += len(moves)
+        scores = stats.evaluate_many(evaluate, len(moves), black, white, sign)
+    else:
+        scores = evaluate(black, white, sign)
+    scores = [int(score) for score in scores]
+    if maximizing_player:
+        best = max(range(len(moves)), key=scores.__getitem__)
+        return moves[best], scores[best]
+    return None, sum(scores) / len(moves)
+
+def probe_order(board, moves, player_color, cache):
+    # Best-looking moves first: those whose reply node has a cached value, highest first,
+    # then the rest by static square weight
     opponent_color = 'W' if player_color == 'B' else 'B'
-    player_score = B_score if player_color == 'B' else W_score
-    opponent_score = W_score if player_color == 'B' else B_score
-
-    score = player_score - opponent_score
-
-    # Calculate corner advantage
-    corners = [(0, 0), (0, board.size - 1), (board.size - 1, 0), (board.size - 1, board.size - 1)]
-    player_corners = sum(1 for x, y in corners if board.board[x][y] == player_color)
-    opponent_corners = sum(1 for x, y in corners if board.board[x][y] == opponent_color)
-    score += 25 * (player_corners - opponent_corners)
-
-    # Calculate edge control
-    edges = [
-        (0, i) for i in range(1, board.size - 1)
-    ] + [(board.size - 1, i) for i in range(1, board.size - 1)] + [
-        (i, 0) for i in range(1, board.size - 1)
-    ] + [(i, board.size - 1) for i in range(1, board.size - 1)]
-    player_edges = sum(1 for x, y in edges if board.board[x][y] == player_color)
-    opponent_edges = sum(1 for x, y in edges if board.board[x][y] == opponent_color)
-    score += 5 * (player_edges - opponent_edges)
-
-    # Calculate mobility
-    player_moves = len(board.get_valid_moves(player_color))
-    opponent_moves = len(board.get_valid_moves(opponent_color))
-    if player_moves + opponent_moves != 0:
-        score += 10 * (player_moves - opponent_moves)
-
-    # Calculate stable discs
-    player_stable_discs = count_stable_discs(board, player_color)
-    opponent_stable_discs = count_stable_discs(board, opponent_color)
-    score += 15 * (player_stable_discs - opponent_stable_discs)
-
-    return score
-
-def count_stable_discs(board, color):
-    stable_discs = 0
-    for x in range(board.size):
-        for y in range(board.size):
-            if board.board[x][y] == color and is_stable(board, x, y):
-                stable_discs += 1
-    return stable_discs
-
-def is_stable(board, x, y):
-    directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-    for dx, dy in directions:
-        nx, ny = x + dx, y + dy
-        while 0 <= nx < board.size and 0 <= ny < board.size:
-            if board.board[nx][ny] is None:
-                return False
-            nx += dx
-            ny += dy
-    return True
-
-def copy_board(board):
-    new_board = Board(board.size)
-    new_board.board = [row[:] for row in board.board]
-    return new_board
+
+    def priority(move):
+        if cache is not None:
+            record = board.make_move(move[0], move[1], player_color)
+            entry = cache.peek(position_key(board, opponent_color))
+            board.unmake_move(record)
+            if entry is not None and entry[3] != UPPER:
+                return 1, entry[2]
+        return 0, SQUARE_WEIGHTS[move[0]][move[1]]
+    return sorted(moves, key=priority, reverse=True)
+
+def max_node(board, depth, player_color, alpha, beta, cache, root=False, stats=None, evaluator=None):
+    # Fail-soft: a value <= alpha is an upper bound, one >= beta a lower bound.
+    # At the root ties go to the first move in get_valid_moves order, as without pruning.
+    if stats is not None:
+        stats.nodes += 1
+    if depth == 0:
+        return None, _evaluate(board, player_color, stats, evaluator)
+    moves = board.get_valid_moves(player_color)
+    if not moves:
+        return None, _evaluate(board, player_color, stats, evaluator)
+    if stats is not None:
+        stats.expand(len(moves))
+    if depth == 1 and np is not None:
+        return score_leaves(board, moves, True, player_color, stats, evaluator)
+    if depth > 1 and len(moves) > 1:
+        moves = probe_order(board, moves, player_color, cache)
+
+    best_move = None
+    best = -INF
+    for move in moves:
+        floor = max(alpha, best - ROOT_TIE_MARGIN if root else best)
+        record = board.make_move(move[0], move[1], player_color)
+        value = chance_node(board, depth - 1, player_color, floor, beta, cache, stats, evaluator)
+        board.unmake_move(record)
+        if value > best or (root and value == best and move < best_move):
+            best = value
+            best_move = move
+        if best >= beta:
+            _cutoff(stats, depth)
+            break
+    return best_move, best
+
+def chance_node(board, depth, player_color, alpha, beta, cache, stats=None, evaluator=None):
+    # Opponent to move, every reply equally likely; fail-soft like max_node
+    if stats is not None:
+        stats.nodes += 1
+    if depth == 0:
+        return _evaluate(board, player_color, stats, evaluator)
+    opponent_color = 'W' if player_color == 'B' else 'B'
+    moves = board.get_valid_moves(opponent_color)
+    if not moves:
+        return _evaluate(board, player_color, stats, evaluator)
+    if stats is not None:
+        stats.expand(len(moves))
+    if depth == 1 and np is not None:
+        return score_leaves(board, moves, False, player_color, stats, evaluator)[1]
+
+    key = None
+    if cache is not None:
+        key = position_key(board, opponent_color)
+        entry = cache.probe(key)
+        # Only entries of the same depth, so values match a search without the cache
+        if entry is not None and entry[1] == depth:
+            score, flag = entry[2], entry[3]
+            if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                cache.cutoffs += 1
+                return score
+
+    low, high = _bounds(evaluator)
+    count = len(moves)
+    lows = [low] * count
+    if depth > 1 and beta < high:
+        # Star2: one probe move per reply gives a lower bound on its value, which may
+        # already put the average above beta
+        low_total = low * count
+        for i, move in enumerate(moves):
+            record = board.make_move(move[0], move[1], opponent_color)
+            lows[i] = probe(board, depth - 1, player_color, count * beta - low_total + low, cache, stats, evaluator)
+            board.unmake_move(record)
+            low_total += lows[i] - low
+            if low_total >= count * beta:
+                _cutoff(stats, depth)
+                return _store(cache, key, depth, low_total / count, LOWER)
+
+    # Star1: the replies still to search are bounded by `high` above and their probes below,
+    # which gives each reply a window outside of which the average is decided
+    expected_value = 0
+    rest_low = sum(lows)
+    for i, move in enumerate(moves):
+        rest_low -= lows[i]
+        rest = count - i - 1
+        child_alpha = count * alpha - expected_value - high * rest
+        child_beta = count * beta - expected_value - rest_low
+        record = board.make_move(move[0], move[1], opponent_color)
+        _, value = max_node(board, depth - 1, player_color, max(child_alpha, low), min(child_beta, high), cache,
+                            stats=stats, evaluator=evaluator)
+        board.unmake_move(record)
+        if value <= child_alpha:
+            _cutoff(stats, depth)
+            return _store(cache, key, depth, (expected_value + value + high * rest) / count, UPPER)
+        if value >= child_beta:
+            _cutoff(stats, depth)
+            return _store(cache, key, depth, (expected_value + value + rest_low) / count, LOWER)
+        expected_value += value
+    return _store(cache, key, depth, expected_value / count, EXACT)
+
+def probe(board, depth, player_color, beta, cache, stats=None, evaluator=None):
+    # Lower bound on a max node from its most promising move alone
+    moves = board.get_valid_moves(player_color)
+    if not moves:
+        return _evaluate(board, player_color, stats, evaluator)
+    move = probe_order(board, moves, player_color, cache)[0] if len(moves) > 1 else moves[0]
+    record = board.make_move(move[0], move[1], player_color)
+    low, high = _bounds(evaluator)
+    value = chance_node(board, depth - 1, player_color, low, min(beta, high), cache, stats, evaluator)
+    board.unmake_move(record)
+    return max(value, low)
+
+def _store(cache, key, depth, value, flag):
+    if cache is not None:
+        cache.store(key, depth, value, flag, None)
+    return value
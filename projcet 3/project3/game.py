@@ -12,6 +12,10 @@ class Agent:
     def __init__(self, color='W'):
         self.color = color
 
+    def close(self):
+        # Release what the agent holds between moves (worker pools); nothing by default
+        pass
+
     # def getAction(self, state):
     #     """
     #     The Agent will receive a GameState (from either {pacman, capture, sonar}.py) and
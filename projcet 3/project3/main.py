@@ -1,7 +1,11 @@
+import argparse
 import pygame
 import pickle
 from game import Game
 from player import Minimaxplayer, RandomPlayer, ExpectimaxPlayer, MCTSPlayer
+from searchstats import SearchStats
+from searchworker import SearchWorker
+from verify import move_to_text
 
 # Define constants
 WINDOW_SIZE = 800  # Increased resolution
@@ -10,6 +14,9 @@ CELL_SIZE = WINDOW_SIZE // GRID_SIZE
 BACKGROUND_COLOR = (0, 128, 0)  # Dark green
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
+FPS = 30
+# Each move stays on screen at least this long, counted from when its search started
+MIN_MOVE_MS = 500
 
 moves_list = []
 
@@ -18,7 +25,7 @@ def read_test_file(filename):
         return pickle.load(handle)
 
 class Othello:
-    def __init__(self):
+    def __init__(self, min_move_ms=MIN_MOVE_MS):
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
         pygame.display.set_caption("Othello")
@@ -31,6 +38,7 @@ class Othello:
         self.correct_moves = 0
         self.move_index = 0
         self.running = True
+        self.min_move_ms = min_move_ms
         self.mode = self.show_menu()
         self.set_players()
 
@@ -67,15 +75,16 @@ class Othello:
                         return ["ai vs ai", "ai vs random", "MCST vs expectimax"][selected]
 
     def set_players(self):
+        # The searching players get a SearchStats so the UI can show their progress
         if self.mode == "ai vs ai":
-            self.player1 = Minimaxplayer('W')
-            self.player2 = Minimaxplayer('B')
+            self.player1 = Minimaxplayer('W', stats=SearchStats())
+            self.player2 = Minimaxplayer('B', stats=SearchStats())
         elif self.mode == "ai vs random":
-            self.player1 = Minimaxplayer('W')
+            self.player1 = Minimaxplayer('W', stats=SearchStats())
             self.player2 = RandomPlayer('B')
         elif self.mode == "MCST vs expectimax":
-            self.player1 = MCTSPlayer('W')
-            self.player2 = ExpectimaxPlayer('B', depth=3)
+            self.player1 = MCTSPlayer('W', stats=SearchStats())
+            self.player2 = ExpectimaxPlayer('B', depth=3, stats=SearchStats())
 
     def draw_board(self):
         self.screen.fill(BACKGROUND_COLOR)
@@ -95,44 +104,76 @@ class Othello:
         text = font.render(turn_text, True, WHITE)
         self.screen.blit(text, (20, 20))
 
+    def display_progress(self, worker):
+        font = pygame.font.SysFont(None, 36)
+        depth, nodes, best = worker.progress()
+        parts = [f"thinking {worker.elapsed():.1f}s"]
+        if depth is not None:
+            parts.append(f"depth {depth}")
+        if nodes:
+            parts.append(f"nodes {nodes}")
+        if best is not None:
+            parts.append(f"best {move_to_text(best)}")
+        if worker.can_cancel:
+            parts.append(" (space: move now)")
+        text = font.render("  ".join(parts), True, WHITE)
+        self.screen.blit(text, (20, WINDOW_SIZE - 40))
+
     def play_ai_game(self):
-        # Main loop for the game
-        while not self.game.is_game_over() and self.running:
-            # Handle events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-            
-            # AI makes its move
-            current_ai = self.game.current_player
-            row, col = current_ai.make_move(self.game.board)
-
-            # Handle AI move validation for testing modes
-            if isinstance(current_ai, Minimaxplayer):
-                if self.mode == "ai vs random" and (row, col) == self.random42[self.move_index]:
-                    self.correct_moves += 1
-                elif self.mode == "ai vs ai" and (row, col) == self.minimax[self.move_index]:
-                    self.correct_moves += 1
-                self.move_index += 1
-
-            # Update board with the move
-            moves_list.append((row, col))
-            if row is not None and col is not None:
-                self.game.board.place_disc(row, col, current_ai.color)
-
-            # Switch turns
-            self.game.switch_turns()
-
-            # Redraw the board and update the display
-            self.draw_board()
-            self.display_turn()
-            pygame.display.flip()
-            pygame.time.delay(500)
-            # Limit the game speed
-            self.clock.tick(30)  # Cap the game at 30 FPS
+        # Main loop for the game. The AI thinks on a worker thread while this loop
+        # keeps handling events and redrawing; space makes it move now, escape quits.
+        worker = SearchWorker()
+        move = None
+        try:
+            while not self.game.is_game_over() and self.running:
+                # Handle events
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                        self.running = False
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                        worker.cancel()
+
+                current_ai = self.game.current_player
+                if not worker.busy and move is None:
+                    worker.start(current_ai, self.game.board)
+                if move is None:
+                    move = worker.poll()
+                # Play the move once it is found and the minimum move time is over
+                if move is not None and worker.elapsed() * 1000 >= self.min_move_ms:
+                    self.apply_move(current_ai, move)
+                    move = None
+
+                # Redraw the board and update the display
+                self.draw_board()
+                self.display_turn()
+                if worker.busy:
+                    self.display_progress(worker)
+                pygame.display.flip()
+                self.clock.tick(FPS)
+        finally:
+            worker.close()
 
         self.end_game()
 
+    def apply_move(self, current_ai, move):
+        row, col = move
+
+        # Handle AI move validation for testing modes
+        if isinstance(current_ai, Minimaxplayer):
+            if self.mode == "ai vs random" and (row, col) == self.random42[self.move_index]:
+                self.correct_moves += 1
+            elif self.mode == "ai vs ai" and (row, col) == self.minimax[self.move_index]:
+                self.correct_moves += 1
+            self.move_index += 1
+
+        # Update board with the move
+        moves_list.append((row, col))
+        if row is not None and col is not None:
+            self.game.board.place_disc(row, col, current_ai.color)
+
+        # Switch turns
+        self.game.switch_turns()
+
     def end_game(self):
         black_score, white_score = self.game.board.get_score()
         font = pygame.font.SysFont(None, 50)
@@ -146,15 +187,26 @@ class Othello:
         text = font.render(result_text, True, (255,0,0))
         self.screen.blit(text, (20, WINDOW_SIZE - 60))
         pygame.display.flip()
-        pygame.time.delay(3000)  # Wait for 3 seconds before quitting
+        # Show the result for 3 seconds before quitting, still answering window events
+        for _ in range(3 * FPS):
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            self.clock.tick(FPS)
         self.agent_accuracy = self.correct_moves
-        if self.mode == "ai vs ai" or self.mode == "ai vs random":
+        # Quitting before the first checked move leaves nothing to score
+        if (self.mode == "ai vs ai" or self.mode == "ai vs random") and self.move_index:
             print(f"Agent Accuracy: {(self.agent_accuracy/self.move_index) *100} %")
         self.running = False
 
 if __name__ == "__main__":
-    game = Othello()
+    parser = argparse.ArgumentParser(description="Watch two AI players in a pygame window.")
+    parser.add_argument("--min-move-ms", type=int, default=MIN_MOVE_MS,
+                        help="shortest time each move stays on screen, including its search")
+    args = parser.parse_args()
+    game = Othello(args.min_move_ms)
     while game.running:
         game.play_ai_game()
+    game.player1.close()
+    game.player2.close()
     
     pygame.quit()
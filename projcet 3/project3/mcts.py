@@ -0,0 +1,238 @@
+import math
+import random
+import time
+from array import array
+
+from bitboard import SQUARE_VALUES, flips_mask, legal_moves_mask
+from evaluation import np
+from rollout import BLACK, WHITE, playout
+from simulator import batch_playouts, random_policy
+
+PASS = -1
+# Softness of the square-weight priors used by PUCT selection
+PRIOR_TEMPERATURE = 20
+# Simulations between calls to MCTSTree.progress
+PROGRESS_INTERVAL = 64
+
+
+class MCTSTree:
+    """Monte Carlo tree search with UCT or PUCT selection.
+
+    Nodes live in parallel arrays indexed by node number rather than as one
+    object each; the children of a node are stored next to each other from
+    first_child[node]. `wins` holds the results (1 win, 0.5 draw) of the
+    side that moved into the node, and a pass is an ordinary edge with move
+    PASS, so every edge alternates the side to move.
+    """
+
+    def __init__(self, exploration=1.4, selection='uct', rollout=playout, rng=random,
+                 leaf_playouts=1, leaf_policy=random_policy):
+        if selection not in ('uct', 'puct'):
+            raise ValueError(f"unknown selection rule {selection!r}")
+        self.exploration = exploration
+        self.selection = selection
+        self.rollout = rollout
+        self.rng = rng
+        # With leaf_playouts > 1 each new leaf is scored by that many games of the
+        # batch simulator, played with `leaf_policy`, instead of a single rollout
+        self.leaf_playouts = leaf_playouts
+        self.leaf_policy = leaf_policy
+        self._batch_rng = None
+        self.playouts = 0
+        self.reused = 0
+        self.stopped = False
+        # Called as progress(done) every PROGRESS_INTERVAL simulations of a search
+        self.progress = None
+        self._reset()
+
+    def _reset(self):
+        self.move = array('b')
+        self.side = array('b')
+        self.black = array('Q')
+        self.white = array('Q')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.child_count = array('b')  # -1 until the node is expanded
+        self.visits = array('i')
+        self.wins = array('d')
+        self.prior = array('d')
+        self.root = None
+
+    def __len__(self):
+        return len(self.visits)
+
+    def _children(self, node):
+        first = self.first_child[node]
+        return range(first, first + max(self.child_count[node], 0))
+
+    def _add(self, move, side, black, white, parent, prior):
+        self.move.append(move)
+        self.side.append(side)
+        self.black.append(black)
+        self.white.append(white)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.child_count.append(-1)
+        self.visits.append(0)
+        self.wins.append(0.0)
+        self.prior.append(prior)
+        return len(self.visits) - 1
+
+    def set_root(self, black, white, side):
+        """Search from this position next, keeping any part of the old tree that leads to it.
+
+        The position is looked for among the root, its children and grandchildren,
+        which covers our last move followed by the opponent's reply.
+        """
+        self.reused = 0
+        if self.root is not None:
+            frontier = [self.root]
+            for _ in range(3):
+                for node in frontier:
+                    if self.black[node] == black and self.white[node] == white and self.side[node] == side:
+                        self._reroot(node)
+                        self.reused = self.visits[self.root]
+                        return
+                frontier = [child for node in frontier for child in self._children(node)]
+        self._reset()
+        self.root = self._add(PASS, side, black, white, -1, 1.0)
+
+    def _reroot(self, node):
+        # Copy the subtree under `node` into fresh arrays, breadth first so siblings stay together
+        old = (self.move, self.side, self.black, self.white, self.first_child, self.child_count,
+               self.visits, self.wins, self.prior)
+        move, side, black, white, first_child, child_count, visits, wins, prior = old
+        self._reset()
+        sources = [node]
+        parents = [-1]
+        index = 0
+        while index < len(sources):
+            source = sources[index]
+            self._add(move[source], side[source], black[source], white[source], parents[index], prior[source])
+            self.visits[index] = visits[source]
+            self.wins[index] = wins[source]
+            if child_count[source] >= 0:
+                self.child_count[index] = child_count[source]
+                self.first_child[index] = len(sources)
+                for child in range(first_child[source], first_child[source] + child_count[source]):
+                    sources.append(child)
+                    parents.append(index)
+            index += 1
+        self.root = 0
+
+    def _expand(self, node):
+        side = self.side[node]
+        black, white = self.black[node], self.white[node]
+        own, opp = (black, white) if side == BLACK else (white, black)
+        moves = legal_moves_mask(own, opp)
+        self.first_child[node] = len(self.visits)
+        if not moves:
+            if legal_moves_mask(opp, own):
+                self._add(PASS, side ^ 1, black, white, node, 1.0)
+                self.child_count[node] = 1
+            else:
+                self.child_count[node] = 0  # game over
+            return
+
+        squares = []
+        while moves:
+            low = moves & -moves
+            squares.append(low)
+            moves ^= low
+        weights = [math.exp(SQUARE_VALUES[move.bit_length() - 1] / PRIOR_TEMPERATURE) for move in squares]
+        total = sum(weights)
+        for move, weight in zip(squares, weights):
+            flips = flips_mask(own, opp, move)
+            new_own, new_opp = own | move | flips, opp ^ flips
+            if side == BLACK:
+                self._add(move.bit_length() - 1, WHITE, new_own, new_opp, node, weight / total)
+            else:
+                self._add(move.bit_length() - 1, BLACK, new_opp, new_own, node, weight / total)
+        self.child_count[node] = len(squares)
+
+    def _select(self, node):
+        # Child with the highest UCT or PUCT value; unvisited children come first under UCT
+        visits, wins, prior = self.visits, self.wins, self.prior
+        first = self.first_child[node]
+        best = first
+        best_value = -math.inf
+        if self.selection == 'uct':
+            log_parent = math.log(max(visits[node], 1))
+            for child in range(first, first + self.child_count[node]):
+                n = visits[child]
+                if n == 0:
+                    return child
+                value = wins[child] / n + self.exploration * math.sqrt(log_parent / n)
+                if value > best_value:
+                    best, best_value = child, value
+        else:
+            sqrt_parent = math.sqrt(visits[node])
+            for child in range(first, first + self.child_count[node]):
+                n = visits[child]
+                q = wins[child] / n if n else 0.5
+                value = q + self.exploration * prior[child] * sqrt_parent / (1 + n)
+                if value > best_value:
+                    best, best_value = child, value
+        return best
+
+    def simulate(self):
+        # One selection, expansion, rollout and backpropagation pass
+        node = self.root
+        path = [node]
+        while self.child_count[node] > 0:
+            node = self._select(node)
+            path.append(node)
+        if self.child_count[node] < 0:
+            self._expand(node)
+            if self.child_count[node] > 0:
+                node = self._select(node)
+                path.append(node)
+
+        if self.leaf_playouts > 1:
+            count = self.leaf_playouts
+            if self._batch_rng is None:
+                self._batch_rng = np.random.default_rng(self.rng.getrandbits(64))
+            difference = batch_playouts(self.black[node], self.white[node], self.side[node], count,
+                                        self._batch_rng, self.leaf_policy)
+            black_result = float((difference > 0).sum() + 0.5 * (difference == 0).sum())
+        else:
+            count = 1
+            difference = self.rollout(self.black[node], self.white[node], self.side[node], self.rng)
+            black_result = 1.0 if difference > 0 else 0.5 if difference == 0 else 0.0
+        self.playouts += count
+        for node in path:
+            self.visits[node] += count
+            # The side that moved into a node is the one not to move there
+            self.wins[node] += black_result if self.side[node] == WHITE else count - black_result
+
+    def search(self, simulations=None, time_ms=None):
+        """Run simulations until `simulations` are done or `time_ms` has passed, whichever is first.
+
+        stop(), from another thread, ends the search after the current simulation;
+        at least one simulation runs so a fresh root always has a move to return.
+        """
+        deadline = time.perf_counter() + time_ms / 1000 if time_ms is not None else None
+        done = 0
+        while simulations is None or done < simulations:
+            if done > 0 and (self.stopped or (deadline is not None and time.perf_counter() >= deadline)):
+                break
+            self.simulate()
+            done += 1
+            if self.progress is not None and done % PROGRESS_INTERVAL == 0:
+                self.progress(done)
+        self.stopped = False
+        return done
+
+    def stop(self):
+        self.stopped = True
+
+    def root_stats(self):
+        # (move, visits, wins) of every root child
+        return [(self.move[child], self.visits[child], self.wins[child]) for child in self._children(self.root)]
+
+    def best_move(self):
+        # Most visited root move as a square index, PASS, or None if the game is over
+        stats = self.root_stats()
+        if not stats:
+            return None
+        return max(stats, key=lambda stat: stat[1])[0]
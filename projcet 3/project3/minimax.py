@@ -1,97 +1,244 @@
-from board import Board
+import time
 
-def minimax(state, lvl, is_maximizing, color, pruning_enabled=False, alpha_val=-float('inf'), beta_val=float('inf')):
-    if lvl == 0 or state.is_terminal():
-        return None, evaluate_board(state, color)
+from board import SQUARE_WEIGHTS
+from evaluation import evaluate_board
+from transposition import EXACT, LOWER, UPPER
+from zobrist import position_key
 
-    moves = state.get_valid_moves(color)
-    if not moves:
-        return None, evaluate_board(state, color)
+INF = float('inf')
 
-    optimal_move = None
 
-    if is_maximizing:
-        best_score = -float('inf')
-        for m in moves:
-            simulated_board = state.copy()
-            simulated_board.place_disc(m[0], m[1], color)
-            _, score = minimax(simulated_board, lvl - 1, False, color, pruning_enabled, alpha_val, beta_val)
-            if score > best_score:
+class SearchTimeout(Exception):
+    """Raised inside the search when the deadline of a timed search has passed."""
+
+
+class NegamaxSearch:
+    """Negamax alpha-beta with principal-variation search and move ordering.
+
+    Scores are from the point of view of the side to move. Moves are ordered
+    previous PV move first, then the transposition-table move, the two killer
+    moves of the ply, and finally by history score plus static square weight.
+    Killers and history live as long as the object, so one instance should be
+    reused for all iterations of a search.
+
+    Among root moves with equal scores the lowest (row, col) is chosen, so the
+    move returned does not depend on move ordering.
+
+    An optional SearchStats `stats` collects nodes, leaves, cutoffs per ply,
+    branching and time per iteration. `evaluator`, called like evaluate_board,
+    replaces it at the leaves (a PatternEvaluator, for instance).
+    """
+
+    def __init__(self, tt=None, pruning_enabled=True, deadline=None, aspiration_window=50, stats=None,
+                 evaluator=None):
+        self.tt = tt
+        self.pruning_enabled = pruning_enabled
+        self.deadline = deadline
+        self.aspiration_window = aspiration_window
+        self.nodes = 0
+        self.killers = {}
+        self.history = {'B': {}, 'W': {}}
+        self.stats = stats
+        self.evaluate = evaluate_board if evaluator is None else evaluator
+        # Called as progress(move, score, depth, nodes) after every finished iteration
+        self.progress = None
+        self.stopped = False
+
+    def order_moves(self, moves, color, ply, hint_move, tt_move):
+        killers = self.killers.get(ply, ())
+        history = self.history[color]
+
+        def priority(move):
+            if move == hint_move:
+                return 4 << 40
+            if move == tt_move:
+                return 3 << 40
+            if move in killers:
+                return (2 << 40) - killers.index(move)
+            return history.get(move, 0) + SQUARE_WEIGHTS[move[0]][move[1]]
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def _record_cutoff(self, move, color, depth, ply):
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        history = self.history[color]
+        history[move] = history.get(move, 0) + depth * depth
+
+    def negamax(self, board, depth, color, alpha=-INF, beta=INF, ply=0, pv=None, pv_hint=None):
+        # `pv`, if given, is filled with the principal variation found below this node.
+        # `pv_hint` is the principal variation of a previous search, tried first.
+        # A pass appears in a principal variation as None.
+        self.nodes += 1
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        if depth == 0:
+            if stats is not None:
+                return stats.evaluate(self.evaluate, board, color)
+            return self.evaluate(board, color)
+
+        opponent = 'W' if color == 'B' else 'B'
+        moves = board.get_valid_moves(color)
+        if not moves:
+            if not board.get_valid_moves(opponent):
+                if stats is not None:
+                    return stats.evaluate(self.evaluate, board, color)
+                return self.evaluate(board, color)
+            child_pv = [] if pv is not None else None
+            score = -self.negamax(board, depth - 1, opponent, -beta, -alpha, ply + 1, child_pv,
+                                  pv_hint[1:] if pv_hint and pv_hint[0] is None else None)
+            if pv is not None:
+                pv[:] = [None] + child_pv
+            return score
+
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            key = position_key(board, color)
+            entry = tt.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_score, entry_flag, tt_move, _ = entry
+                if entry_depth >= depth and (entry_flag == EXACT
+                                             or (entry_flag == LOWER and entry_score >= beta)
+                                             or (entry_flag == UPPER and entry_score <= alpha)):
+                    tt.cutoffs += 1
+                    if pv is not None:
+                        pv[:] = [tt_move]
+                    return entry_score
+        alpha_orig = alpha
+        if stats is not None:
+            stats.expand(len(moves))
+
+        hint_move = pv_hint[0] if pv_hint else None
+        best_score = -INF
+        best_move = None
+        for i, move in enumerate(self.order_moves(moves, color, ply, hint_move, tt_move)):
+            child_pv = [] if pv is not None else None
+            child_hint = pv_hint[1:] if move == hint_move else None
+            record = board.make_move(move[0], move[1], color)
+            if i == 0 or not self.pruning_enabled:
+                score = -self.negamax(board, depth - 1, opponent, -beta, -alpha, ply + 1, child_pv, child_hint)
+            elif ply == 0:
+                # At the root the null window sits just below alpha so that moves tying the
+                # best are searched exactly too, and ties go to the lowest square rather than
+                # to whichever move happened to be ordered first
+                score = -self.negamax(board, depth - 1, opponent, -alpha, -alpha + 1, ply + 1, child_pv, child_hint)
+                if alpha <= score < beta:
+                    score = -self.negamax(board, depth - 1, opponent, -beta, -alpha + 1, ply + 1, child_pv, child_hint)
+            else:
+                # Prove the move is no better than the current best with a null window,
+                # and only search it properly when that fails
+                score = -self.negamax(board, depth - 1, opponent, -alpha - 1, -alpha, ply + 1, child_pv, child_hint)
+                if alpha < score < beta:
+                    score = -self.negamax(board, depth - 1, opponent, -beta, -alpha, ply + 1, child_pv, child_hint)
+            board.unmake_move(record)
+
+            if score > best_score or (ply == 0 and score == best_score and move < best_move):
                 best_score = score
-                optimal_move = m
-            if pruning_enabled:
-                alpha_val = max(alpha_val, score)
-                if beta_val <= alpha_val:
+                best_move = move
+                if pv is not None:
+                    pv[:] = [move] + child_pv
+            if self.pruning_enabled:
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    self._record_cutoff(move, color, depth, ply)
+                    if stats is not None:
+                        stats.cutoff(ply)
                     break
-        return optimal_move, best_score
+
+        if tt is not None:
+            if best_score <= alpha_orig:
+                flag = UPPER
+            elif best_score >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            tt.store(key, depth, best_score, flag, best_move)
+        return best_score
+
+    def stop(self):
+        # May be called from another thread: the running iterate() returns its last
+        # finished iteration as if the deadline had passed
+        self.stopped = True
+        self.deadline = 0.0
+
+    def iterate(self, board, color, max_depth, deadline=None):
+        """Iterative deepening with aspiration windows up to `max_depth`.
+
+        Returns (move, score, depth) from the last iteration that finished.
+        Depth 1 ignores the deadline and stop() so there is always a move to return;
+        a stop() that came before the call is honoured from depth 2 on.
+        """
+        B_score, W_score = board.get_score()
+        max_depth = max(1, min(max_depth, board.size * board.size - B_score - W_score))
+
+        # A timed-out iteration leaves discs on the board, so search a private copy
+        board = board.copy()
+        result = (None, None, 0)
+        pv = []
+        for depth in range(1, max_depth + 1):
+            if depth > 1 and self.stopped:
+                break
+            self.deadline = deadline if depth > 1 else None
+            if depth > 1 and self.stopped:
+                self.deadline = 0.0  # stop() ran between the check and the assignment
+            if self.stats is not None:
+                self.stats.start_depth(depth)
+            line = []
+            try:
+                if result[1] is None or not self.pruning_enabled:
+                    score = self.negamax(board, depth, color, -INF, INF, 0, line, pv)
+                else:
+                    alpha = result[1] - self.aspiration_window
+                    beta = result[1] + self.aspiration_window
+                    score = self.negamax(board, depth, color, alpha, beta, 0, line, pv)
+                    if score <= alpha or score >= beta:
+                        line = []
+                        score = self.negamax(board, depth, color, -INF, INF, 0, line, pv)
+            except SearchTimeout:
+                break
+            result = (line[0] if line else None, score, depth)
+            pv = line
+            if self.stats is not None:
+                self.stats.end_depth()
+                self.stats.best = result[0]
+            if self.progress is not None:
+                self.progress(result[0], score, depth, self.nodes)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.deadline = None
+        self.stopped = False
+        return result
+
+
+def minimax(state, lvl, is_maximizing, color, pruning_enabled=True, alpha_val=-INF, beta_val=INF,
+            tt=None, deadline=None, pv=None, pv_hint=None, stats=None, evaluator=None):
+    # Fixed-depth search; the score is from `color`'s point of view and
+    # is_maximizing=False means the opponent is to move
+    search = NegamaxSearch(tt, pruning_enabled, deadline, stats=stats, evaluator=evaluator)
+    line = []
+    if is_maximizing:
+        score = search.negamax(state, lvl, color, alpha_val, beta_val, 0, line, pv_hint)
     else:
-        worst_score = float('inf')
         opponent = 'W' if color == 'B' else 'B'
-        for m in moves:
-            simulated_board = state.copy()
-            simulated_board.place_disc(m[0], m[1], opponent)
-            _, score = minimax(simulated_board, lvl - 1, True, color, pruning_enabled, alpha_val, beta_val)
-            if score < worst_score:
-                worst_score = score
-                optimal_move = m
-            if pruning_enabled:
-                beta_val = min(beta_val, score)
-                if beta_val <= alpha_val:
-                    break
-        return optimal_move, worst_score
-
-def evaluate_board(board, player_color):
-    B_score, W_score = board.get_score()
-    opponent_color = 'W' if player_color == 'B' else 'B'
-    player_score = B_score if player_color == 'B' else W_score
-    opponent_score = W_score if player_color == 'B' else B_score
-
-    score = player_score - opponent_score
-
-    # Calculate corner advantage
-    corners = [(0, 0), (0, board.size - 1), (board.size - 1, 0), (board.size - 1, board.size - 1)]
-    player_corners = sum(1 for x, y in corners if board.board[x][y] == player_color)
-    opponent_corners = sum(1 for x, y in corners if board.board[x][y] == opponent_color)
-    score += 25 * (player_corners - opponent_corners)
-
-    # Calculate edge control
-    edges = [
-        (0, i) for i in range(1, board.size - 1)
-    ] + [(board.size - 1, i) for i in range(1, board.size - 1)] + [
-        (i, 0) for i in range(1, board.size - 1)
-    ] + [(i, board.size - 1) for i in range(1, board.size - 1)]
-    player_edges = sum(1 for x, y in edges if board.board[x][y] == player_color)
-    opponent_edges = sum(1 for x, y in edges if board.board[x][y] == opponent_color)
-    score += 5 * (player_edges - opponent_edges)
-
-    # Calculate mobility
-    player_moves = len(board.get_valid_moves(player_color))
-    opponent_moves = len(board.get_valid_moves(opponent_color))
-    if player_moves + opponent_moves != 0:
-        score += 10 * (player_moves - opponent_moves)
-
-    # Calculate stable discs
-    player_stable_discs = count_stable_discs(board, player_color)
-    opponent_stable_discs = count_stable_discs(board, opponent_color)
-    score += 15 * (player_stable_discs - opponent_stable_discs)
-
-    return score
-
-def count_stable_discs(board, color):
-    stable_discs = 0
-    for x in range(board.size):
-        for y in range(board.size):
-            if board.board[x][y] == color and is_stable(board, x, y):
-                stable_discs += 1
-    return stable_discs
-
-def is_stable(board, x, y):
-    directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-    for dx, dy in directions:
-        nx, ny = x + dx, y + dy
-        while 0 <= nx < board.size and 0 <= ny < board.size:
-            if board.board[nx][ny] is None:
-                return False
-            nx += dx
-            ny += dy
-    return True
+        score = -search.negamax(state, lvl, opponent, -beta_val, -alpha_val, 0, line, pv_hint)
+    if pv is not None:
+        pv[:] = line
+    return (line[0] if line else None), score
+
+
+def iterative_deepening(state, color, time_ms, pruning_enabled=True, tt=None, max_depth=None, stats=None,
+                        evaluator=None):
+    """Search depth 1, 2, 3... until `time_ms` runs out.
+
+    Returns (move, score, depth) from the last iteration that finished.
+    """
+    deadline = time.perf_counter() + time_ms / 1000
+    search = NegamaxSearch(tt, pruning_enabled, stats=stats, evaluator=evaluator)
+    return search.iterate(state, color, max_depth or state.size * state.size, deadline)
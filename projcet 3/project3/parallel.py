@@ -0,0 +1,193 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from expectimax import expectimax
+from mcts import MCTSTree
+from minimax import INF, NegamaxSearch, SearchTimeout
+from transposition import TranspositionTable
+from zobrist import position_key
+
+# Iterations this shallow are cheaper to run in the main process than to ship out
+SERIAL_DEPTH = 2
+
+# Per-process state of a pool worker, set up once by _init_worker
+_search = None
+_alpha = None
+
+
+def _init_worker(alpha, tt_size, evaluator):
+    global _search, _alpha
+    _alpha = alpha
+    _search = NegamaxSearch(TranspositionTable(tt_size) if tt_size else None, evaluator=evaluator)
+
+
+def _search_root_move(board, color, move, depth, seconds):
+    # Score one root move against the best score found so far by any process.
+    # Returns (move, score, exact); a score that is not exact is only an upper bound
+    # below the shared alpha, so the move cannot be the best. Returns None on timeout.
+    _search.deadline = time.perf_counter() + seconds if seconds is not None else None
+    alpha = _alpha.value
+    opponent = 'W' if color == 'B' else 'B'
+    board.make_move(move[0], move[1], color)
+    try:
+        # Ties with alpha still have to be searched exactly, hence alpha - 1
+        score = -_search.negamax(board, depth - 1, opponent, -INF, -(alpha - 1), 1)
+    except SearchTimeout:
+        return None
+    finally:
+        _search.deadline = None
+    if score <= alpha - 1:
+        return move, score, False
+    with _alpha.get_lock():
+        if score > _alpha.value:
+            _alpha.value = score
+    return move, score, True
+
+
+def _expectimax_root_move(board, color, move, depth, pruning, evaluator):
+    board.make_move(move[0], move[1], color)
+    return expectimax(board, depth - 1, False, color, pruning=pruning, evaluator=evaluator)[1]
+
+
+def _mcts_root_stats(black, white, side, simulations, time_ms, exploration, selection, leaf_playouts, seed):
+    # An independent tree with its own seeded generator; returns its root statistics and playout count
+    tree = MCTSTree(exploration, selection, rng=random.Random(seed), leaf_playouts=leaf_playouts)
+    tree.set_root(black, white, side)
+    tree.search(simulations, time_ms)
+    return tree.root_stats(), tree.playouts
+
+
+class ParallelSearch:
+    """Root-splitting search over a pool of worker processes.
+
+    Minimax uses young brothers wait: the best move of the previous iteration
+    is searched first in this process, then the remaining root moves are
+    searched by the workers against a shared alpha that every worker raises
+    as it finds better moves. The result is the same move and score as
+    NegamaxSearch.iterate at the same depth. The pool is kept between moves;
+    call close() when done.
+    """
+
+    def __init__(self, workers, tt=None, tt_size=1 << 16, evaluator=None):
+        self.workers = workers
+        self.tt = tt
+        self.evaluator = evaluator
+        self.alpha = multiprocessing.Value('d', -INF)
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self.alpha, tt_size, evaluator))
+        self.search = NegamaxSearch(tt, evaluator=evaluator)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def iterate(self, board, color, max_depth, deadline=None):
+        """Parallel counterpart of NegamaxSearch.iterate; returns (move, score, depth)."""
+        B_score, W_score = board.get_score()
+        max_depth = max(1, min(max_depth, board.size * board.size - B_score - W_score))
+        result = self.search.iterate(board, color, min(max_depth, SERIAL_DEPTH), deadline)
+        for depth in range(result[2] + 1, max_depth + 1):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            found = self.split_root(board, color, depth, result[0], deadline)
+            if found is None:
+                break
+            result = found + (depth,)
+        return result
+
+    def split_root(self, board, color, depth, hint_move, deadline=None):
+        # One iteration at `depth`; returns (move, score), or None if the deadline passed
+        moves = board.get_valid_moves(color)
+        if len(moves) < 2:
+            move, score, _ = self.search.iterate(board, color, depth)
+            return move, score
+
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.peek(position_key(board, color))
+            tt_move = entry[4] if entry is not None else None
+        first, *rest = self.search.order_moves(moves, color, 0, hint_move, tt_move)
+
+        # The eldest brother is searched with a full window before the others start
+        child = board.copy()
+        child.make_move(first[0], first[1], color)
+        self.search.deadline = deadline
+        try:
+            best_score = -self.search.negamax(child, depth - 1, 'W' if color == 'B' else 'B', -INF, INF, 1)
+        except SearchTimeout:
+            return None
+        finally:
+            self.search.deadline = None
+        best_move = first
+        self.alpha.value = best_score
+
+        seconds = deadline - time.perf_counter() if deadline is not None else None
+        futures = [self.pool.submit(_search_root_move, board, color, move, depth, seconds) for move in rest]
+        results = [future.result() for future in futures]
+        if None in results:
+            return None
+        for move, score, exact in results:
+            if exact and (score > best_score or (score == best_score and move < best_move)):
+                best_score = score
+                best_move = move
+        return best_move, best_score
+
+    def expectimax(self, board, depth, color, pruning=False):
+        """Same (move, value) as expectimax(board, depth, True, color), one root move per task."""
+        moves = board.get_valid_moves(color)
+        if depth == 0 or len(moves) < 2:
+            return expectimax(board, depth, True, color, pruning=pruning, evaluator=self.evaluator)
+        values = list(self.pool.map(_expectimax_root_move, [board] * len(moves), [color] * len(moves),
+                                    moves, [depth] * len(moves), [pruning] * len(moves),
+                                    [self.evaluator] * len(moves)))
+        # First strict maximum, as the serial loop picks it
+        best = max(range(len(moves)), key=values.__getitem__)
+        return moves[best], values[best]
+
+
+class ParallelMCTS:
+    """Root-parallel MCTS: one independent tree per worker, root statistics summed.
+
+    Worker seeds are drawn from one random.Random(seed), so with a simulation
+    budget the chosen moves depend only on the seed and the number of workers.
+    """
+
+    def __init__(self, workers, exploration=1.4, selection='uct', seed=42, leaf_playouts=1):
+        self.workers = workers
+        self.exploration = exploration
+        self.selection = selection
+        self.leaf_playouts = leaf_playouts
+        self.rng = random.Random(seed)
+        self.pool = ProcessPoolExecutor(workers)
+        self.playouts = 0
+
+    def close(self):
+        self.pool.shutdown()
+
+    def search(self, black, white, side, simulations=None, time_ms=None):
+        """Merged (move, visits, wins) of the root moves, in square order."""
+        seeds = [self.rng.getrandbits(64) for _ in range(self.workers)]
+        if simulations is not None:
+            shares = [simulations // self.workers + (index < simulations % self.workers)
+                      for index in range(self.workers)]
+        else:
+            shares = [None] * self.workers
+        futures = [self.pool.submit(_mcts_root_stats, black, white, side, share, time_ms,
+                                    self.exploration, self.selection, self.leaf_playouts, seed)
+                   for share, seed in zip(shares, seeds)]
+        merged = {}
+        self.playouts = 0
+        for future in futures:
+            stats, playouts = future.result()
+            self.playouts += playouts
+            for move, visits, wins in stats:
+                total_visits, total_wins = merged.get(move, (0, 0.0))
+                merged[move] = (total_visits + visits, total_wins + wins)
+        return [(move, visits, wins) for move, (visits, wins) in sorted(merged.items())]
+
+    def best_move(self, black, white, side, simulations=None, time_ms=None):
+        # Most visited move over all trees, the lowest square on ties
+        stats = self.search(black, white, side, simulations, time_ms)
+        if not stats:
+            return None
+        return max(stats, key=lambda stat: stat[1])[0]
@@ -0,0 +1,311 @@
+import argparse
+import os
+import time
+
+from book import SQUARE_MAP
+from board import Board
+from evaluation import _require_numpy, flip_masks, np, unpack
+from rollout import BLACK
+from simulator import BatchGames, _pick, greedy_policy, random_policy
+from stability import A_FILE
+
+# Base squares of each pattern in the digit order of its table. The other instances are the
+# images of these under the board symmetries, and every instance of a pattern shares its table.
+PATTERNS = {
+    'edge': [(0, col) for col in range(8)],
+    'corner': [(row, col) for row in range(3) for col in range(3)],
+    'diagonal': [(i, i) for i in range(8)],
+    'diagonal7': [(i, i + 1) for i in range(7)],
+}
+# Weights are fitted separately for each stage of the game, STAGE_DISCS discs wide
+STAGES = 6
+STAGE_DISCS = 10
+STAGE = [min(STAGES - 1, max(0, (discs - 4) // STAGE_DISCS)) for discs in range(65)]
+# Scores are final disc differences in units of 1/SCALE disc
+SCALE = 16
+# Share of self-play moves played at random, so the games cover more positions
+EPSILON = 0.1
+
+# Gathering multipliers: bit (row, col) of a mask with one square per column lands on bit
+# 56 + col of the product, and bit (row, 0) of a single column on bit 56 + row
+ROW_GATHER = 0x0101010101010101
+COLUMN_GATHER = 0x0102040810204080
+
+
+def _instances():
+    # (pattern, squares in digit order) of every distinct instance
+    found = []
+    for pattern, base in PATTERNS.items():
+        seen = set()
+        for symmetry in range(8):
+            squares = [SQUARE_MAP[symmetry][row * 8 + col] for row, col in base]
+            if frozenset(squares) not in seen:
+                seen.add(frozenset(squares))
+                found.append((pattern, squares))
+    return found
+
+
+INSTANCES = _instances()
+OFFSETS = {}
+SIZE = 0
+for _pattern, _base in PATTERNS.items():
+    OFFSETS[_pattern] = SIZE
+    SIZE += 3 ** len(_base)
+BIAS = SIZE  # one constant weight per stage after the pattern tables
+SIZE += 1
+
+
+def _line_gather(squares):
+    # (shift, mask, multiplier) bringing the squares into the top byte of the product
+    mask = sum(1 << square for square in squares)
+    columns = {square & 7 for square in squares}
+    if len(columns) == len(squares):
+        return 0, mask, ROW_GATHER
+    column = columns.pop()
+    return column, A_FILE, COLUMN_GATHER
+
+
+def _ternary(squares, gather):
+    # Table index contribution of every gathered byte: 3 ** digit for each square present
+    positions = [gather(1 << square).bit_length() - 1 for square in squares]
+    width = 1 << (max(positions) + 1)
+    return [sum(3 ** digit for digit, position in enumerate(positions) if bits >> position & 1)
+            for bits in range(width)]
+
+
+def _block_bits(x):
+    # The 3x3 block at the corner of bit 0 as 9 bits, row by row
+    return (x & 7) | (x >> 5 & 0x38) | (x >> 10 & 0x1C0)
+
+
+def _gathers():
+    # Lines (shift, mask, multiplier, own index, opponent index) and corner blocks (shift, own index,
+    # opponent index), where the index lists map gathered bits to table offsets
+    lines, blocks = [], []
+    for pattern, squares in INSTANCES:
+        offset = OFFSETS[pattern]
+        if pattern == 'corner':
+            shift = min(square >> 3 for square in squares) * 8 + min(square & 7 for square in squares)
+            ternary = _ternary(squares, lambda bits: _block_bits(bits >> shift))
+            blocks.append((shift, [offset + value for value in ternary], [2 * value for value in ternary]))
+        else:
+            shift, mask, multiplier = _line_gather(squares)
+            ternary = _ternary(squares, lambda bits: ((bits >> shift) & mask) * multiplier >> 56 & 0xFF)
+            lines.append((shift, mask, multiplier, [offset + value for value in ternary],
+                          [2 * value for value in ternary]))
+    return lines, blocks
+
+
+LINES, BLOCKS = _gathers()
+
+
+def features(own, opp):
+    """(N, instances + 1) flat weight indices of (N,) uint64 own/opp masks, the stage bias last."""
+    _require_numpy()
+    own = np.asarray(own, dtype=np.uint64).reshape(-1)
+    opp = np.asarray(opp, dtype=np.uint64).reshape(-1)
+    states = unpack(own).reshape(-1, 64).astype(np.int64) + 2 * unpack(opp).reshape(-1, 64)
+    discs = states.astype(bool).sum(axis=1)
+    base = np.asarray(STAGE)[discs] * SIZE
+    columns = []
+    for pattern, squares in INSTANCES:
+        powers = 3 ** np.arange(len(squares), dtype=np.int64)
+        columns.append(base + OFFSETS[pattern] + states[:, squares] @ powers)
+    columns.append(base + BIAS)
+    return np.stack(columns, axis=1)
+
+
+def self_play(count, policy, rng):
+    """Play `count` games with a batch policy; (own, opp, label) of every position from both sides.
+
+    The label is own discs minus opponent discs at the end of the game.
+    """
+    board = Board()
+    games = BatchGames.repeat(board.black, board.white, BLACK, count)
+    black, white, game = [], [], []
+    while True:
+        live = np.nonzero(~games.done)[0]
+        black.append(games.black[live])
+        white.append(games.white[live])
+        game.append(live)
+        if not games.step(policy, rng):
+            break
+    result = games.disc_difference()[np.concatenate(game)]
+    black, white = np.concatenate(black), np.concatenate(white)
+    return np.concatenate([black, white]), np.concatenate([white, black]), np.concatenate([result, -result])
+
+
+def square_policy(games, moves, rng):
+    # greedy_policy with EPSILON of the moves random, to start self-play without weights
+    explore = rng.random(len(games)) < EPSILON
+    return np.where(explore, random_policy(games, moves, rng), greedy_policy(games, moves, rng))
+
+
+def pattern_policy(weights, epsilon=EPSILON):
+    # Batch policy playing the move whose position scores best under float `weights`
+    def policy(games, moves, rng):
+        to_black = games.side == BLACK
+        own = np.where(to_black, games.black, games.white)
+        opp = np.where(to_black, games.white, games.black)
+        scores = np.full((len(games), 64), -np.inf)
+        for square in range(64):
+            bit = np.uint64(1 << square)
+            playable = np.nonzero(moves & bit)[0]
+            if len(playable):
+                flips = flip_masks(own[playable], opp[playable], np.full(len(playable), bit))
+                child = features(own[playable] | bit | flips, opp[playable] ^ flips)
+                scores[playable, square] = weights[child].sum(axis=1)
+        scores += rng.random(scores.shape) * 1e-6
+        explore = rng.random(len(games)) < epsilon
+        scores = np.where(explore[:, None] & (scores > -np.inf), rng.random(scores.shape), scores)
+        return _pick(moves, scores)
+    return policy
+
+
+def fit(rows, labels, ridge=1.0, iterations=200, tolerance=1e-6):
+    """Ridge least squares over the sparse 0/1 feature rows by CGLS; float weights per flat index."""
+    count = STAGES * SIZE
+    columns = rows.shape[1]
+    labels = np.asarray(labels, dtype=np.float64)
+    flat = rows.ravel()
+
+    def forward(x):
+        return x[rows].sum(axis=1)
+
+    def backward(r):
+        return np.bincount(flat, weights=np.repeat(r, columns), minlength=count)
+
+    x = np.zeros(count)
+    r = labels.copy()
+    s = backward(r)
+    p = s.copy()
+    gamma = s @ s
+    start = gamma
+    for _ in range(iterations):
+        q = forward(p)
+        alpha = gamma / (q @ q + ridge * (p @ p))
+        x += alpha * p
+        r -= alpha * q
+        s = backward(r) - ridge * x
+        following = s @ s
+        if following <= tolerance * start:
+            break
+        p = s + (following / gamma) * p
+        gamma = following
+    return x
+
+
+def save(weights, path):
+    """Write float disc weights as an int16 (STAGES, SIZE) table in units of 1/SCALE disc."""
+    table = np.clip(np.rint(np.asarray(weights) * SCALE), -32768, 32767).astype(np.int16)
+    np.save(path, table.reshape(STAGES, SIZE))
+
+
+def train(games, rounds, seed=None, ridge=1.0, log=print):
+    """Fit weights from `rounds` batches of self-play games; returns float disc weights.
+
+    The first batch is played by the static square weights, every later one by the
+    weights fitted so far, and each fit uses all the games played up to then.
+    """
+    rng = np.random.default_rng(seed)
+    rows, labels = [], []
+    weights = None
+    for round_ in range(rounds):
+        start = time.perf_counter()
+        policy = square_policy if weights is None else pattern_policy(weights)
+        own, opp, label = self_play(games, policy, rng)
+        rows.append(features(own, opp))
+        labels.append(label)
+        played = time.perf_counter()
+        weights = fit(np.concatenate(rows), np.concatenate(labels), ridge)
+        error = np.abs(weights[rows[-1]].sum(axis=1) - label).mean()
+        log(f"round {round_ + 1}: {len(label)} positions played in {played - start:.1f}s, "
+            f"fitted in {time.perf_counter() - played:.1f}s, mean error {error:.2f} discs")
+    return weights
+
+
+class PatternEvaluator:
+    """Pattern-table evaluation loaded from a file written by `save`.
+
+    Every edge, corner 3x3 block and long diagonal of the board is read as a
+    base-3 number that indexes its pattern's table for the stage of the game,
+    so a position costs one lookup per instance plus the stage bias. The table
+    is memory-mapped; scores are in 1/SCALE disc from the side given.
+    """
+
+    def __init__(self, path):
+        _require_numpy()
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+        if self.table.shape != (STAGES, SIZE) or self.table.dtype != np.int16:
+            raise ValueError(f"{path} is not a pattern table of shape {(STAGES, SIZE)}")
+        self.weights = memoryview(self.table).cast('B').cast('h')
+        self.bases = [STAGE[discs] * SIZE for discs in range(65)]
+        # Lowest and highest score any position can get, for expectimax's chance-node cutoffs
+        lows, highs = [], []
+        for stage in self.table:
+            low = high = int(stage[BIAS])
+            for pattern, squares in INSTANCES:
+                part = stage[OFFSETS[pattern]:OFFSETS[pattern] + 3 ** len(squares)]
+                low += int(part.min())
+                high += int(part.max())
+            lows.append(low)
+            highs.append(high)
+        self.bounds = min(lows), max(highs)
+
+    def __reduce__(self):
+        # Pool workers reopen the file instead of receiving the table
+        return PatternEvaluator, (self.path,)
+
+    def score(self, own, opp):
+        weights = self.weights
+        base = self.bases[(own | opp).bit_count()]
+        total = weights[base + BIAS]
+        for shift, mask, multiplier, own_index, opp_index in LINES:
+            total += weights[base + own_index[((own >> shift) & mask) * multiplier >> 56 & 0xFF]
+                             + opp_index[((opp >> shift) & mask) * multiplier >> 56 & 0xFF]]
+        for shift, own_index, opp_index in BLOCKS:
+            x, y = own >> shift, opp >> shift
+            total += weights[base + own_index[(x & 7) | (x >> 5 & 0x38) | (x >> 10 & 0x1C0)]
+                             + opp_index[(y & 7) | (y >> 5 & 0x38) | (y >> 10 & 0x1C0)]]
+        return total
+
+    def __call__(self, board, player_color):
+        # Drop-in for evaluate_board
+        if player_color == 'B':
+            return self.score(board.black, board.white)
+        return self.score(board.white, board.black)
+
+    def evaluate_masks(self, black, white, sign):
+        """Scores of (N,) uint64 black/white masks from the side given by +1/-1 `sign`; evaluate_masks' counterpart."""
+        black = np.asarray(black, dtype=np.uint64)
+        white = np.asarray(white, dtype=np.uint64)
+        sign = np.broadcast_to(np.asarray(sign), black.shape)
+        own = np.where(sign > 0, black, white)
+        opp = np.where(sign > 0, white, black)
+        return np.asarray(self.table).reshape(-1)[features(own, opp)].sum(axis=1, dtype=np.int64)
+
+
+def open_patterns(patterns):
+    # Players accept a path or a PatternEvaluator
+    return PatternEvaluator(patterns) if isinstance(patterns, (str, os.PathLike)) else patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit pattern-table evaluation weights from self-play games.")
+    parser.add_argument("--games", type=int, default=5000, help="games of self-play per round")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds of self-play, each with the latest weights")
+    parser.add_argument("--ridge", type=float, default=1.0, help="L2 regularization of the least-squares fit")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", default="patterns.npy")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    weights = train(args.games, args.rounds, args.seed, args.ridge)
+    save(weights, args.output)
+    print(f"{len(INSTANCES)} pattern instances, {STAGES} stages, {os.path.getsize(args.output)} bytes written "
+          f"to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
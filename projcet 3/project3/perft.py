@@ -0,0 +1,189 @@
+import argparse
+import json
+import random
+import time
+
+from bitboard import BitBoard, flips_mask, legal_moves_mask
+from board import Board
+
+# Leaf counts from the start position with black to move; a pass counts as a move
+# and a finished game as a leaf
+START_COUNTS = {1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092, 8: 390216, 9: 3005288, 10: 24571284}
+
+# Mid-game positions: 64 squares row by row ('B', 'W' or '.') and the side to move.
+# Their counts come from the list-based Board and agree with the bitboard generator.
+POSITIONS = {
+    'early': ("..........B........BW.....BWW.....WBW....W.B....W..BW...........", 'B',
+              {1: 8, 2: 63, 3: 523, 4: 4666, 5: 42214, 6: 421649}),
+    'middle': (".......B......B..BBBBB....BBBB..WWBBBW...WWWWB...BBBB...B..B....", 'B',
+               {1: 8, 2: 99, 3: 732, 4: 10107, 5: 83012}),
+    'late': (".BBBBB....BWWB..BBWBWWWW.WWWWWW.WWWWWB..WWW.WBB.WW.BBBB......BBB", 'B',
+             {1: 8, 2: 85, 3: 761, 4: 7757, 5: 67848}),
+    # Black has no move and must pass
+    'pass': ("..WWW....B.W......BB.......BB......BB.......B...................", 'B',
+             {1: 1, 2: 3, 3: 8, 4: 58, 5: 359, 6: 3070}),
+}
+
+
+def board_from_text(text):
+    # Board from 64 characters of 'B', 'W' and '.'
+    board = Board()
+    board.board = [[None if text[row * 8 + col] == '.' else text[row * 8 + col] for col in range(8)]
+                   for row in range(8)]
+    return board
+
+
+def board_to_text(board):
+    return ''.join(disc or '.' for row in board.board for disc in row)
+
+
+def perft(own, opp, depth, passed=False):
+    # Leaves `depth` plies below the position, side to move owning `own`
+    if depth == 0:
+        return 1
+    moves = legal_moves_mask(own, opp)
+    if not moves:
+        if passed:
+            return 1  # neither side can move: the game is over
+        return perft(opp, own, depth - 1, True)
+    if depth == 1:
+        return moves.bit_count()
+    nodes = 0
+    while moves:
+        move = moves & -moves
+        moves ^= move
+        flips = flips_mask(own, opp, move)
+        nodes += perft(opp ^ flips, own | move | flips, depth - 1)
+    return nodes
+
+
+def perft_board(board, color, depth):
+    # perft through the Board interface (get_valid_moves/make_move/unmake_move)
+    if depth == 0:
+        return 1
+    opponent = 'W' if color == 'B' else 'B'
+    moves = board.get_valid_moves(color)
+    if not moves:
+        if not board.get_valid_moves(opponent):
+            return 1
+        return perft_board(board, opponent, depth - 1)
+    nodes = 0
+    for move in moves:
+        record = board.make_move(move[0], move[1], color)
+        nodes += perft_board(board, opponent, depth - 1)
+        board.unmake_move(record)
+    return nodes
+
+
+def reference_positions():
+    # (name, board, color, {depth: count}) for the start position and POSITIONS
+    positions = [('start', Board(), 'B', START_COUNTS)]
+    for name, (text, color, counts) in POSITIONS.items():
+        positions.append((name, board_from_text(text), color, counts))
+    return positions
+
+
+def check_caches(games=100, seed=0):
+    """Random make/unmake walks on Board, comparing its incremental frontier and
+    legal-move caches with a full rescan of the same position.
+
+    Moves are picked from the bitboard generator so the caches are only read when
+    checked, and checks are skipped at random so changes pile up between them.
+    Returns (positions checked, list of mismatch descriptions).
+    """
+    rng = random.Random(seed)
+    checked = 0
+    mismatches = []
+    for game in range(games):
+        board = Board()
+        color = 'B'
+        history = []
+        while True:
+            if history and rng.random() < 0.3:
+                record, color = history.pop()
+                board.unmake_move(record)
+            else:
+                own, opp = (board.black, board.white) if color == 'B' else (board.white, board.black)
+                moves = legal_moves_mask(own, opp)
+                if not moves:
+                    if not legal_moves_mask(opp, own):
+                        break
+                    color = 'W' if color == 'B' else 'B'
+                    continue
+                squares = [index for index in range(64) if moves >> index & 1]
+                index = rng.choice(squares)
+                history.append((board.make_move(index // 8, index % 8, color), color))
+                color = 'W' if color == 'B' else 'B'
+            if rng.random() < 0.5:
+                continue
+            fresh = board.copy()
+            fresh._recount()
+            checked += 1
+            for name, cached, expected in (('frontier', board.frontier, fresh.frontier),
+                                           ('B moves', board.get_valid_moves('B'), fresh.get_valid_moves('B')),
+                                           ('W moves', board.get_valid_moves('W'), fresh.get_valid_moves('W'))):
+                if cached != expected:
+                    mismatches.append(f"game {game}, {board_to_text(board)}: {name} {cached} != {expected}")
+    return checked, mismatches
+
+
+def run(max_depth, implementation='bitboard'):
+    """Count every reference position up to `max_depth`; returns one result dict per (position, depth)."""
+    results = []
+    for name, board, color, counts in reference_positions():
+        for depth in range(1, max_depth + 1):
+            start = time.perf_counter()
+            if implementation == 'bitboard':
+                own, opp = (board.black, board.white) if color == 'B' else (board.white, board.black)
+                nodes = perft(own, opp, depth)
+            else:
+                search_board = BitBoard.from_board(board) if implementation == 'BitBoard' else board.copy()
+                nodes = perft_board(search_board, color, depth)
+            elapsed = time.perf_counter() - start
+            expected = counts.get(depth)
+            results.append({
+                'position': name,
+                'depth': depth,
+                'nodes': nodes,
+                'expected': expected,
+                'ok': expected is None or nodes == expected,
+                'seconds': elapsed,
+                'nodes_per_second': nodes / elapsed if elapsed else 0.0,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move-generation leaf nodes and check them against reference counts.")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--implementation", choices=['bitboard', 'Board', 'BitBoard'], default='bitboard',
+                        help="raw bitboard functions, or the make/unmake interface of Board or BitBoard")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--check-caches", type=int, default=0, metavar="GAMES",
+                        help="also play GAMES random make/unmake walks checking Board's incremental move caches")
+    args = parser.parse_args()
+
+    results = run(args.depth, args.implementation)
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+    failed = False
+    print(f"{'position':<10} {'depth':>5} {'nodes':>10} {'expected':>10} {'nodes/s':>10}")
+    for result in results:
+        expected = '' if result['expected'] is None else result['expected']
+        mark = '' if result['ok'] else '  MISMATCH'
+        failed |= not result['ok']
+        print(f"{result['position']:<10} {result['depth']:>5} {result['nodes']:>10} {expected:>10} "
+              f"{result['nodes_per_second']:>10.0f}{mark}")
+    if args.check_caches:
+        checked, mismatches = check_caches(args.check_caches)
+        for mismatch in mismatches[:10]:
+            print(f"cache MISMATCH {mismatch}")
+        print(f"Board caches: {checked} positions checked, {len(mismatches)} mismatches")
+        failed |= bool(mismatches)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,111 @@
-from minimax import minimax
+from minimax import NegamaxSearch
+from parallel import ParallelMCTS, ParallelSearch
 from expectimax import expectimax
-from board import Board
+from mcts import BLACK, WHITE, MCTSTree
+from book import open_book
+from endgame import EndgameSolver, empties
+from bitboard import square_bit
+from evaluation import INTELLIGENT_WEIGHTS, evaluate_board, evaluate_preview, np
 from game import Agent
+from patterns import open_patterns
+from searchstats import make_stats
+from simulator import BatchGames, get_policy
+from transposition import TranspositionTable
 import random 
-from collections import defaultdict
+import time
+
+
+def solved_move(solver, board, color, search_stats=None):
+    # Perfect-play move from the endgame solver, reported with its solve time and nodes
+    move, score = solver.solve(board, color)
+    stats = solver.stats
+    if search_stats is not None:
+        search_stats.nodes += stats['nodes']
+    print(f"AI ({color}) plays: {move} (solved {score:+d} with {stats['empties']} empties "
+          f"in {stats['seconds']:.2f}s, {stats['nodes']} nodes)")
+    return move
+
+
+class SearchPlayer(Agent):
+    """Base of the searching players.
+
+    make_move plays the opening-book move while the position is in `book` (a
+    path or an OpeningBook), solves positions with `endgame` or fewer empty
+    squares exactly and searches the rest with the subclass's `_search`. With
+    `stats`, a SearchStats or the path of a JSON lines file, every move is
+    recorded under the player's `name` together with the counters of `cache`,
+    the player's transposition table if it has one.
+    """
+
+    name = None
+    stoppable = False  # whether stop() cuts the running search short
+
+    def __init__(self, color, book=None, endgame=None, stats=None):
+        super().__init__(color)
+        self.book = open_book(book) if book else None
+        self.endgame = endgame
+        self.solver = EndgameSolver() if endgame else None
+        self.stats = make_stats(stats)
+        self.cache = None
+        self.parallel = None  # process pool of the parallel searches, shut down by close()
+        self.running = None  # the search stop() reaches, while one runs
+        self.stopping = False
+
+    def make_move(self, board):
+        if self.stats is not None:
+            self.stats.begin()
+        if self.cache is not None:
+            self.cache.new_search()
+        try:
+            move = self._prepared_move(board)
+            if move is None:
+                move = self._search(board)
+        finally:
+            self.running = None
+            self.stopping = False
+        if self.stats is not None:
+            self.stats.finish(self.name, self.color, move, self.cache, **self._record())
+        return move
+
+    def _prepared_move(self, board):
+        # Book move or exact endgame move, or None when the position has to be searched
+        if self.book is not None:
+            move = self.book.move(board, self.color)
+            if move is not None:
+                print(f"AI ({self.color}) plays: {move} (book)")
+                return move
+        if self.solver is not None and empties(board) <= self.endgame:
+            move = solved_move(self.solver, board, self.color, self.stats)
+            return (None, None) if move is None else move
+        return None
+
+    def stop(self):
+        # From another thread: the running search, or the one about to start, answers now
+        self.stopping = True
+        search = self.running
+        if search is not None:
+            search.stop()
+
+    def _publish(self, search):
+        # Make `search` the one stop() reaches; a stop() that came before it still counts
+        search.stopped = False
+        self.running = search
+        if self.stopping:
+            search.stop()
+
+    def close(self):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    def _search(self, board):
+        raise NotImplementedError
+
+    def _record(self):
+        # Extra fields of the stats record
+        return {}
+
+
 class RandomPlayer(Agent):
     def __init__(self, color):
         super().__init__(color)
@@ -19,86 +121,96 @@ class RandomPlayer(Agent):
 
 
 
-class MCTSPlayer(Agent):
-    def __init__(self, color, simulations=100):
-        super().__init__(color)
-        random.seed(42)
-        self.simulations = simulations
-    
-    def simulate_random_game(self, board, color):
-        current_color = color
-        while not board.is_full() and board.get_valid_moves(current_color):
-            valid_moves = board.get_valid_moves(current_color)
-            if valid_moves:
-                move = random.choice(valid_moves)
-                board.place_disc(move[0], move[1], current_color)
-            current_color = 'B' if current_color == 'W' else 'W'
-        return board.get_score()
-
-    def mcts(self, board, simulations):
-        # Monte Carlo Tree Search main function
-        win_counts = defaultdict(int)
-        play_counts = defaultdict(int)
+class MCTSPlayer(SearchPlayer):
+    name = 'mcts'
 
-        for _ in range(simulations):
-            # Choose a random valid move and simulate the result
-            temp_board = board.copy()
-            valid_moves = board.get_valid_moves(self.color)
-            if not valid_moves:
-                return None, None
+    def __init__(self, color, simulations=100, time_ms=None, exploration=1.4, selection='uct',
+                 workers=None, seed=42, leaf_playouts=1, book=None, endgame=None, stats=None):
+        super().__init__(color, book, endgame, stats)
+        # Budget per move: `simulations` playouts, or as many as fit in `time_ms` when it is given
+        self.simulations = simulations
+        self.time_ms = time_ms
+        # Own generator so seeding does not disturb the global one other players use
+        self.rng = random.Random(seed)
+        # The tree is kept between moves and re-rooted on the position we are given next
+        # `leaf_playouts` > 1 scores each new leaf with a batch of NumPy playouts
+        self.tree = MCTSTree(exploration, selection, rng=self.rng, leaf_playouts=leaf_playouts)
+        # With `workers` > 1 every move runs that many independent trees in a process pool
+        self.parallel = (ParallelMCTS(workers, exploration, selection, seed, leaf_playouts)
+                         if workers and workers > 1 else None)
 
-            move = random.choice(valid_moves)
-            temp_board.place_disc(move[0], move[1], self.color)
+    def mcts(self, board, simulations, stats=None):
+        # Monte Carlo Tree Search main function
+        if not board.get_valid_moves(self.color):
+            return None, None
+        side = BLACK if self.color == 'B' else WHITE
+        time_ms = self.time_ms
+        if time_ms is not None:
+            simulations = None
+        if self.parallel is not None:
+            square = self.parallel.best_move(board.black, board.white, side, simulations, time_ms)
+            if stats is not None:
+                stats.playouts += self.parallel.playouts
+                stats.leaves += self.parallel.playouts
+        else:
+            tree = self.tree
+            tree.set_root(board.black, board.white, side)
+            self._publish(tree)
+            if stats is not None:
+                base = (stats.nodes - len(tree), stats.playouts - tree.playouts, stats.leaves - tree.playouts)
 
-            score_B, score_W = self.simulate_random_game(temp_board, 'B' if self.color == 'W' else 'W')
-            winner = 'B' if score_B > score_W else 'W'
+                def progress(done=None):
+                    # Counters kept live for anything polling `stats` during the search
+                    stats.nodes = base[0] + len(tree)
+                    stats.playouts = base[1] + tree.playouts
+                    stats.leaves = base[2] + tree.playouts
+                    square = tree.best_move()
+                    stats.best = None if square is None else divmod(square, 8)
+                tree.progress = progress
+            try:
+                tree.search(simulations, time_ms)
+            finally:
+                tree.progress = None
+            square = tree.best_move()
+            if stats is not None:
+                progress()
+                for count in tree.child_count:
+                    if count > 0:
+                        stats.expand(count)
+        return square // 8, square % 8
 
-            play_counts[move] += 1
-            if winner == self.color:
-                win_counts[move] += 1
+    @property
+    def stoppable(self):
+        # stop() plays the most visited move now; the parallel trees cannot be stopped
+        return self.parallel is None
 
-        # Choose the move with the highest win rate
-        best_move = max(valid_moves, key=lambda x: win_counts[x] / play_counts[x])
-        return best_move
+    def _search(self, board):
+        return self.mcts(board, self.simulations, self.stats)
 
-    def make_move(self, board):
-        # Use MCTS to make a move
-        return self.mcts(board, self.simulations)
+    def _record(self):
+        return {'reused_visits': self.tree.reused if self.parallel is None else 0}
 
 class IntelligentPlayer(Agent):
-    def __init__(self, color):
+    def __init__(self, color, evaluator=None):
         super().__init__(color)
+        # Optional PatternEvaluator (or the path of its table) used instead of the heuristic
+        self.evaluator = open_patterns(evaluator) if evaluator else None
     
     def evaluate_board(self, board):
-        """Enhanced board evaluation function with more complex heuristics."""
-        black_score, white_score = board.get_score()
-        score = black_score if self.color == 'B' else white_score
-        
-        # Corner heuristic: prioritize control of corners
-        corners = [(0, 0), (0, board.size - 1), (board.size - 1, 0), (board.size - 1, board.size - 1)]
-        corner_value = 25
-        for row, col in corners:
-            if board.board[row][col] == self.color:
-                score += corner_value
-            elif board.board[row][col] == ('W' if self.color == 'B' else 'B'):
-                score -= corner_value
-        
-        # Mobility heuristic: maximize our valid moves, minimize opponent's
-        opponent_color = 'W' if self.color == 'B' else 'B'
-        my_moves = len(board.get_valid_moves(self.color))
-        opponent_moves = len(board.get_valid_moves(opponent_color))
-        mobility_value = 5
-        score += mobility_value * (my_moves - opponent_moves)
-        
-        return score
+        """Corner and mobility heuristic from the shared evaluator."""
+        if self.evaluator is not None:
+            return self.evaluator(board, self.color)
+        return evaluate_board(board, self.color, INTELLIGENT_WEIGHTS)
 
     def get_move_score(self, board, move):
         """Evaluate the board score after making the move."""
         if move is None:
             return float('-inf')  # No move, very bad score
-        temp_board = board.copy()
-        temp_board.place_disc(move[0], move[1], self.color)
-        return self.evaluate_board(temp_board)
+        preview = board.preview_move(move[0], move[1], self.color)
+        if self.evaluator is not None:
+            own, opp = (board.black, board.white) if self.color == 'B' else (board.white, board.black)
+            return self.evaluator.score(own | square_bit(move[0], move[1]) | preview.flips, opp ^ preview.flips)
+        return evaluate_preview(board, self.color, move[0], move[1], preview, INTELLIGENT_WEIGHTS)
 
     def make_move(self, board):
         valid_moves = board.get_valid_moves(self.color)
@@ -130,93 +242,102 @@ class FirstValidMovePlayer(Agent):
             return None
         return valid_moves[0]    
     
-class EvaluativePlayer(Agent):
-    def __init__(self, color):
-        super().__init__(color)
-    
-    def make_move(self, board):
-        valid_moves = board.get_valid_moves(self.color)
-        if not valid_moves:
-            print(f"{self.color} has no valid moves.")
-            return None
-        print("valid moves: ",valid_moves)
-        # Simple evaluation: Choose the move that flips the most discs
-        best_move = None
-        max_flips = 0
-        
-        for move in valid_moves:
-            row, col = move
-            # Copy the board and simulate the move
-            board_copy = self.copy_board(board)
-            board_copy.place_disc(row, col, self.color)
-            flips = self.count_flips(board_copy, row, col, self.color)
-            if flips > max_flips:
-                max_flips = flips
-                best_move = move
-        
-        return best_move
-
-    def copy_board(self, board):
-        # Create a deep copy of the board to simulate moves
-        new_board = Board(board.size)
-        new_board.board = [row[:] for row in board.board]
-        return new_board
-    
-    def count_flips(self, board, row, col, color):
-        # Count how many discs would be flipped by placing a disc at (row, col)
-        flips = 0
-        opponent_color = 'W' if color == 'B' else 'B'
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while 0 <= r < board.size and 0 <= c < board.size and board.board[r][c] == opponent_color:
-                r += dr
-                c += dc
-                if 0 <= r < board.size and 0 <= c < board.size and board.board[r][c] == color:
-                    flips += len([(i, j) for i in range(row + dr, r + dr, dr) for j in range(col + dc, c + dc, dc)])
-                    break
-        
-        return flips
-
+class Minimaxplayer(SearchPlayer):
+    name = 'minimax'
 
-class Minimaxplayer(Agent):
-    def __init__(self, color, depth=3):
-        super().__init__(color)
+    def __init__(self, color, depth=3, tt_size=None, time_ms=None, workers=None, book=None, endgame=None,
+                 stats=None, evaluator=None):
+        super().__init__(color, book, endgame, stats)
         self.depth = depth
+        # Optional PatternEvaluator (or the path of its table) used at the leaves instead of evaluate_board
+        self.evaluator = open_patterns(evaluator) if evaluator else None
+        # With `time_ms` the player deepens until the budget runs out instead of using `depth`
+        self.time_ms = time_ms
+        # Optional transposition table with `tt_size` slots, kept between moves
+        self.tt = self.cache = TranspositionTable(tt_size) if tt_size else None
+        self.search_stats = None
+        # With `workers` > 1 the root moves are split over a pool of processes kept between moves
+        self.parallel = (ParallelSearch(workers, self.tt, tt_size or 1 << 16, self.evaluator)
+                         if workers and workers > 1 else None)
 
-    def make_move(self, board):
-        # Use minimax to determine the best move
-        move, _ = minimax(board, self.depth, True, self.color)
+    @property
+    def stoppable(self):
+        # stop() returns the deepest finished iteration now; the parallel search cannot be stopped
+        return self.parallel is None
 
-        print(f"AI ({self.color}) plays: {move}")
+    def _search(self, board):
+        # Use minimax to determine the best move
+        search = self.parallel
+        if search is None:
+            search = NegamaxSearch(self.tt, stats=self.stats, evaluator=self.evaluator)
+            self._publish(search)
+        if self.time_ms is not None:
+            deadline = time.perf_counter() + self.time_ms / 1000
+            move, _, reached = search.iterate(board, self.color, board.size * board.size, deadline)
+            print(f"AI ({self.color}) plays: {move} (depth {reached})")
+        else:
+            move, _, _ = search.iterate(board, self.color, self.depth)
+            print(f"AI ({self.color}) plays: {move}")
+        if self.tt is not None:
+            self.search_stats = self.tt.stats()
+            print(f"  TT hit rate {self.search_stats['hit_rate']:.1%}, "
+                  f"cutoffs {self.search_stats['cutoffs']}, "
+                  f"memory {self.search_stats['memory_bytes'] / 1024:.0f} KiB")
         if move is None:
             return (None,None)
         
         return move
 
 
-class ExpectimaxPlayer:
-    def __init__(self, color, depth=3):
-        self.color = color
+class ExpectimaxPlayer(SearchPlayer):
+    name = 'expectimax'
+
+    def __init__(self, color, depth=3, workers=None, pruning=False, cache_size=1 << 16, book=None, endgame=None,
+                 stats=None, evaluator=None):
+        super().__init__(color, book, endgame, stats)
         self.depth = depth
+        # Optional PatternEvaluator (or the path of its table) used at the leaves instead of evaluate_board
+        self.evaluator = open_patterns(evaluator) if evaluator else None
+        self.parallel = ParallelSearch(workers, evaluator=self.evaluator) if workers and workers > 1 else None
+        # Star1/Star2 pruning with a cache of chance-node values kept between moves
+        self.pruning = pruning
+        self.cache = TranspositionTable(cache_size) if pruning and cache_size else None
 
-    def make_move(self, board):
-        move, _ = expectimax(board, self.depth, True, self.color)
+    def _search(self, board):
+        if self.stats is not None:
+            self.stats.start_depth(self.depth)
+        if self.parallel is not None:
+            move, _ = self.parallel.expectimax(board, self.depth, self.color, self.pruning)
+        else:
+            move, _ = expectimax(board, self.depth, True, self.color, pruning=self.pruning, cache=self.cache,
+                                 stats=self.stats, evaluator=self.evaluator)
+        if self.stats is not None:
+            self.stats.end_depth()
         print(f"AI ({self.color}) plays: {move}")
         if move is None:
             return (None,None)
         return move
 
 
+class PolicyPlayer(Agent):
+    def __init__(self, color, policy='greedy', seed=42):
+        super().__init__(color)
+        # One of the simulator's batch policies, played here on a batch of one game
+        self.policy = get_policy(policy)
+        self.rng = np.random.default_rng(seed)
+
+    def make_move(self, board):
+        games = BatchGames(board.black, board.white, BLACK if self.color == 'B' else WHITE)
+        square = int(self.policy(games, games.legal_moves(), self.rng)[0])
+        return (None, None) if square < 0 else divmod(square, 8)
+
+
 class EvaluativePlayer(Agent):
     def __init__(self, color):
         super().__init__(color)
     
     def make_move(self, board):
-        print(self.color)
         valid_moves = board.get_valid_moves(self.color)
-        print(valid_moves)
         if not valid_moves:
             print(f"{self.color} has no valid moves.")
             return None
@@ -226,37 +347,14 @@ class EvaluativePlayer(Agent):
         max_flips = 0
         
         for move in valid_moves:
-            row, col = move
-            print(move)
-            # Copy the board and simulate the move
-            board_copy = self.copy_board(board)
-            board_copy.place_disc(row, col, self.color)
-            flips = self.count_flips(board_copy, row, col, self.color)
+            flips = self.count_flips(board, move[0], move[1], self.color)
             if flips > max_flips:
                 max_flips = flips
                 best_move = move
-        print(best_move)
+        
         return best_move
 
-    def copy_board(self, board):
-        # Create a deep copy of the board to simulate moves
-        new_board = Board(board.size)
-        new_board.board = [row[:] for row in board.board]
-        return new_board
-    
     def count_flips(self, board, row, col, color):
         # Count how many discs would be flipped by placing a disc at (row, col)
-        flips = 0
-        opponent_color = 'W' if color == 'B' else 'B'
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while 0 <= r < board.size and 0 <= c < board.size and board.board[r][c] == opponent_color:
-                r += dr
-                c += dc
-                if 0 <= r < board.size and 0 <= c < board.size and board.board[r][c] == color:
-                    flips += len([(i, j) for i in range(row + dr, r + dr, dr) for j in range(col + dc, c + dc, dc)])
-                    break
-        
-        return flips
\ No newline at end of file
+        preview = board.preview_move(row, col, color)
+        return 0 if preview is None else preview.flips.bit_count()
@@ -0,0 +1,88 @@
+import random
+
+from bitboard import FULL, NOT_A_FILE, NOT_H_FILE
+
+BLACK, WHITE = 0, 1
+
+
+def _rays(index):
+    # Bits of the squares walking away from `index` in each direction that has at least two squares
+    row, col = index >> 3, index & 7
+    rays = []
+    for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)):
+        ray = []
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray.append(1 << (r * 8 + c))
+            r, c = r + dr, c + dc
+        if len(ray) >= 2:  # a flip needs an opponent disc and an own disc beyond it
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+
+# RAYS[square] holds the rays out of the square, each as a tuple of single-bit masks
+RAYS = tuple(_rays(index) for index in range(64))
+
+
+def _flips(own, opp, index):
+    flips = 0
+    for ray in RAYS[index]:
+        run = 0
+        for bit in ray:
+            if bit & opp:
+                run |= bit
+            else:
+                if bit & own:
+                    flips |= run
+                break
+    return flips
+
+
+def _near(mask):
+    # Squares next to any square in `mask`
+    return (((mask << 1) & NOT_A_FILE) | ((mask >> 1) & NOT_H_FILE)
+            | (mask << 8) | (mask >> 8)
+            | ((mask << 9) & NOT_A_FILE) | ((mask >> 9) & NOT_H_FILE)
+            | ((mask << 7) & NOT_H_FILE) | ((mask >> 7) & NOT_A_FILE)) & FULL
+
+
+def playout(black, white, side, rng=random):
+    """Play uniformly random moves to the end of the game; returns black discs minus white discs.
+
+    Instead of generating every legal move, each ply draws random empty squares
+    next to an opponent disc and plays the first that flips something. Squares
+    that do not are struck off, so the move played is uniform over the legal
+    moves, and the side passes once none are left.
+    """
+    own, opp = (black, white) if side == BLACK else (white, black)
+    uniform = rng.random
+    passed = False
+    while True:
+        candidates = _near(opp) & ~(own | opp)
+        count = candidates.bit_count()
+        flips = 0
+        while count:
+            # Pick a random candidate square by skipping a random number of set bits
+            pick = candidates
+            for _ in range(int(uniform() * count)):
+                pick &= pick - 1
+            bit = pick & -pick
+            index = bit.bit_length() - 1
+            flips = _flips(own, opp, index)
+            if flips:
+                own |= bit | flips
+                opp ^= flips
+                break
+            candidates ^= bit
+            count -= 1
+        if not flips:
+            if passed:
+                break
+            passed = True
+        else:
+            passed = False
+        own, opp = opp, own
+        side ^= 1
+    if side == WHITE:
+        own, opp = opp, own
+    return own.bit_count() - opp.bit_count()
@@ -0,0 +1,87 @@
+import json
+import time
+
+
+class SearchStats:
+    """Counters for one move's search, filled in by the engines that are given one.
+
+    Searches take `stats=None` and only touch the counters when an object is
+    passed, so an uninstrumented search pays one `is not None` test per node.
+    `begin` starts a move, `finish` turns the counters into a record and, if
+    `path` is set, appends it to that file as one JSON line.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.begin()
+
+    def begin(self):
+        self.start = time.perf_counter()
+        self.nodes = 0
+        self.leaves = 0
+        self.interior = 0  # nodes whose moves were generated
+        self.moves = 0  # moves generated at those nodes
+        self.cutoffs = {}  # ply -> beta cutoffs
+        self.depth = 0  # nominal depth of the iteration running
+        self.depth_seconds = {}  # depth -> seconds from the start of the move to the end of its iteration
+        self.eval_seconds = 0.0
+        self.playouts = 0
+        self.best = None  # best move found so far, for displays that poll a running search
+
+    def start_depth(self, depth):
+        self.depth = depth
+
+    def end_depth(self):
+        self.depth_seconds[self.depth] = time.perf_counter() - self.start
+
+    def expand(self, count):
+        self.interior += 1
+        self.moves += count
+
+    def cutoff(self, ply):
+        self.cutoffs[ply] = self.cutoffs.get(ply, 0) + 1
+
+    def evaluate(self, function, *args):
+        # Call an evaluator, counting the leaf and the time spent in it
+        start = time.perf_counter()
+        value = function(*args)
+        self.eval_seconds += time.perf_counter() - start
+        self.leaves += 1
+        return value
+
+    def evaluate_many(self, function, count, *args):
+        # Same for an evaluator that scores `count` leaves in one call
+        start = time.perf_counter()
+        value = function(*args)
+        self.eval_seconds += time.perf_counter() - start
+        self.leaves += count
+        return value
+
+    def finish(self, player=None, color=None, move=None, cache=None, **extra):
+        """Record of the move; `cache` is a TranspositionTable whose counters cover this move."""
+        seconds = time.perf_counter() - self.start
+        record = {
+            'player': player,
+            'color': color,
+            'move': None if move is None or move[0] is None else list(move),
+            'seconds': seconds,
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'nodes_per_second': self.nodes / seconds if seconds else 0.0,
+            'branching_factor': self.moves / self.interior if self.interior else 0.0,
+            'cutoffs_per_ply': {str(ply): count for ply, count in sorted(self.cutoffs.items())},
+            'depth_seconds': {str(depth): elapsed for depth, elapsed in sorted(self.depth_seconds.items())},
+            'cache_hit_rate': cache.hits / cache.probes if cache is not None and cache.probes else None,
+            'eval_share': self.eval_seconds / seconds if seconds else 0.0,
+            'playouts': self.playouts,
+        }
+        record.update(extra)
+        if self.path:
+            with open(self.path, 'a') as handle:
+                handle.write(json.dumps(record) + '\n')
+        return record
+
+
+def make_stats(stats):
+    # Players accept a SearchStats or the path of a JSON lines file to write one to
+    return SearchStats(stats) if isinstance(stats, str) else stats
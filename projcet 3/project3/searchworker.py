@@ -0,0 +1,81 @@
+import queue
+import threading
+import time
+
+
+class SearchWorker:
+    """Runs players' moves on a background thread so the caller's loop keeps going.
+
+    `start` hands a player and a copy of the board to the thread, `poll`
+    returns the finished move (or None while it is still thinking) and
+    `progress` reads the live counters of players that were given a
+    SearchStats. `cancel` asks the running search to answer now; players
+    that are not `stoppable` just finish their move.
+    """
+
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.player = None  # player whose move is being searched, None when idle
+        self.started = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.requests.get()
+            if job is None:
+                return
+            player, board = job
+            try:
+                move = player.make_move(board)
+            except Exception as error:  # handed to the caller, which raises it in its own thread
+                move = error
+            self.results.put(move)
+
+    @property
+    def busy(self):
+        return self.player is not None
+
+    def start(self, player, board):
+        if self.busy:
+            raise RuntimeError("a move is already being searched")
+        self.player = player
+        self.started = time.perf_counter()
+        self.requests.put((player, board.copy()))
+
+    def poll(self):
+        # The move of the search started last, or None while it is running
+        try:
+            move = self.results.get_nowait()
+        except queue.Empty:
+            return None
+        self.player = None
+        if isinstance(move, Exception):
+            raise move
+        return move
+
+    def elapsed(self):
+        return time.perf_counter() - self.started if self.started is not None else 0.0
+
+    def progress(self):
+        # (depth, nodes, best move so far) of the running search; None where the player does not say
+        stats = getattr(self.player, 'stats', None)
+        if stats is None:
+            return None, None, None
+        return stats.depth or None, stats.nodes, stats.best
+
+    @property
+    def can_cancel(self):
+        # Whether cancel() cuts the running search short rather than waiting for it
+        return getattr(self.player, 'stoppable', False)
+
+    def cancel(self):
+        stop = getattr(self.player, 'stop', None)
+        if stop is not None:
+            stop()
+
+    def close(self):
+        # Cancel the running search and let the thread exit once it returns
+        self.cancel()
+        self.requests.put(None)
@@ -0,0 +1,136 @@
+from bitboard import SQUARE_VALUES
+from board import Board
+from evaluation import _require_numpy, flip_masks, legal_moves, np, popcount, unpack
+from rollout import BLACK
+
+
+def random_policy(games, moves, rng):
+    # Uniformly random legal move in every game
+    return _pick(moves, rng.random((len(moves), 64)))
+
+
+def greedy_policy(games, moves, rng):
+    # Legal move on the best static square, ties broken at random
+    return _pick(moves, _square_values() + rng.random((len(moves), 64)))
+
+
+# Policies by name, for player specs
+POLICIES = {'random': random_policy, 'greedy': greedy_policy}
+
+
+def get_policy(name):
+    if name not in POLICIES:
+        raise ValueError(f"unknown policy {name!r}, expected one of {', '.join(POLICIES)}")
+    return POLICIES[name]
+
+
+def _square_values():
+    return np.array(SQUARE_VALUES, dtype=np.float64)
+
+
+def _pick(moves, scores):
+    # Square index of the highest-scoring legal move per game; -1 where there is none
+    legal = unpack(moves).reshape(-1, 64)
+    scores = np.where(legal, scores, -np.inf)
+    return np.where(legal.any(axis=1), scores.argmax(axis=1), -1)
+
+
+class BatchGames:
+    """N Othello games played in lockstep on (N,) uint64 black/white masks.
+
+    `side` holds BLACK or WHITE to move per game and `done` marks finished
+    games. A side with no legal move passes; a game is done when neither
+    side can move. `moves[i, side]` counts the discs each side has played.
+    """
+
+    def __init__(self, black, white, side):
+        _require_numpy()
+        self.black = np.array(black, dtype=np.uint64).reshape(-1)
+        self.white = np.array(white, dtype=np.uint64).reshape(-1)
+        self.side = np.broadcast_to(np.asarray(side, dtype=np.int8), self.black.shape).copy()
+        self.done = np.zeros(len(self.black), dtype=bool)
+        self.moves = np.zeros((len(self.black), 2), dtype=np.int32)
+
+    @classmethod
+    def repeat(cls, black, white, side, count):
+        # `count` copies of one position
+        return cls(np.full(count, black, dtype=np.uint64), np.full(count, white, dtype=np.uint64), side)
+
+    def __len__(self):
+        return len(self.black)
+
+    def _own_opp(self):
+        to_black = self.side == BLACK
+        return (np.where(to_black, self.black, self.white), np.where(to_black, self.white, self.black))
+
+    def legal_moves(self):
+        # Legal-move masks of the side to move (0 in finished games)
+        own, opp = self._own_opp()
+        return np.where(self.done, np.uint64(0), legal_moves(own, opp))
+
+    def play(self, squares):
+        """Play square index `squares[i]` in game i, or pass where it is -1, then switch sides."""
+        squares = np.asarray(squares)
+        own, opp = self._own_opp()
+        passing = squares < 0
+        played = np.nonzero(~passing)[0]
+        np.add.at(self.moves, (played, self.side[played]), 1)
+        shifts = np.where(passing, 0, squares).astype(np.uint64)
+        bits = np.where(passing, np.uint64(0), np.left_shift(np.uint64(1), shifts))
+        flips = flip_masks(own, opp, bits)
+        own = own | bits | flips
+        opp = opp ^ flips
+        to_black = self.side == BLACK
+        self.black = np.where(to_black, own, opp)
+        self.white = np.where(to_black, opp, own)
+        self.side = np.where(self.done, self.side, self.side ^ 1).astype(np.int8)
+
+    def step(self, policy, rng):
+        # One ply in every unfinished game; returns False once all games are over
+        moves = self.legal_moves()
+        stuck = (moves == 0) & ~self.done
+        if stuck.any():
+            # Without a move the side passes, unless the opponent cannot move either
+            own, opp = self._own_opp()
+            self.done |= stuck & (legal_moves(opp, own) == 0)
+        if self.done.all():
+            return False
+        self.play(policy(self, moves, rng))
+        return True
+
+    def run(self, policy=random_policy, rng=None, white_policy=None):
+        """Play every game to the end; returns black discs minus white discs per game.
+
+        `policy` moves for both sides unless `white_policy` is given.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        if white_policy is None:
+            while self.step(policy, rng):
+                pass
+        else:
+            def both(games, moves, rng):
+                return np.where(games.side == BLACK, policy(games, moves, rng), white_policy(games, moves, rng))
+            while self.step(both, rng):
+                pass
+        return self.disc_difference()
+
+    def disc_difference(self):
+        return popcount(self.black) - popcount(self.white)
+
+
+def batch_playouts(black, white, side, count, rng, policy=random_policy):
+    # `count` playouts from one position at once; black minus white discs for each
+    return BatchGames.repeat(black, white, side, count).run(policy, rng)
+
+
+def play_match(black_policy, white_policy, count=None, seed=None, games=None):
+    """Play `count` games from the opening, or the BatchGames `games` from where they
+    stand, to the end between two batch policies.
+
+    Returns (black wins, white wins, draws).
+    """
+    if games is None:
+        board = Board()
+        games = BatchGames.repeat(board.black, board.white, BLACK, count)
+    difference = games.run(black_policy, np.random.default_rng(seed), white_policy)
+    return int((difference > 0).sum()), int((difference < 0).sum()), int((difference == 0).sum())
@@ -0,0 +1,70 @@
+from bitboard import FULL, NOT_A_FILE, NOT_H_FILE
+
+# Masks for an 8x8 board with square (row, col) at bit row * 8 + col
+A_FILE = FULL & ~NOT_A_FILE  # column 0
+H_FILE = FULL & ~NOT_H_FILE  # column 7
+TOP_ROW = 0xFF
+BOTTOM_ROW = 0xFF << 56
+
+
+def _line(row, col, dr, dc):
+    # Mask of the whole line through (row, col) in direction (dr, dc), both ways
+    mask = 0
+    r, c = row, col
+    while 0 <= r < 8 and 0 <= c < 8:
+        mask |= 1 << (r * 8 + c)
+        r, c = r - dr, c - dc
+    r, c = row + dr, col + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        mask |= 1 << (r * 8 + c)
+        r, c = r + dr, c + dc
+    return mask
+
+
+# LINES[square] holds the row, column, diagonal and anti-diagonal through the square
+LINES = [tuple(_line(index >> 3, index & 7, dr, dc) for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)))
+         for index in range(64)]
+# The distinct lines of each of the four axes
+AXIS_LINES = [sorted({lines[axis] for lines in LINES}) for axis in range(4)]
+
+
+def full_line_masks(occupied):
+    # For each axis, the squares whose line along that axis has no empty square
+    return [sum(line for line in lines if occupied & line == line) for lines in AXIS_LINES]
+
+
+def _stable_step(own, stable, full):
+    # Discs of `own` that cannot be flipped along any axis given the discs already known stable.
+    # Along an axis a disc is safe if the line is full, or a neighbour on that axis is
+    # off the board or a stable disc of the same colour.
+    horizontal = full[0] | A_FILE | H_FILE | ((stable << 1) & NOT_A_FILE) | ((stable >> 1) & NOT_H_FILE)
+    vertical = full[1] | TOP_ROW | BOTTOM_ROW | ((stable << 8) & FULL) | (stable >> 8)
+    diagonal = (full[2] | A_FILE | H_FILE | TOP_ROW | BOTTOM_ROW
+                | ((stable << 9) & NOT_A_FILE) | ((stable >> 9) & NOT_H_FILE))
+    anti_diagonal = (full[3] | A_FILE | H_FILE | TOP_ROW | BOTTOM_ROW
+                     | ((stable << 7) & NOT_H_FILE) | ((stable >> 7) & NOT_A_FILE))
+    return own & horizontal & vertical & diagonal & anti_diagonal
+
+
+def stable_masks(black, white):
+    """Masks of the black and white discs that can never be flipped again.
+
+    Starts from discs that are safe on every axis because of the board edge or
+    full lines (corners, filled rows...) and flood-fills outwards: a disc is
+    stable when, on each axis, its line is full or it touches a stable disc of
+    its own colour or the edge.
+    """
+    full = full_line_masks(black | white)
+    stable_black = stable_white = 0
+    while True:
+        next_black = _stable_step(black, stable_black, full)
+        next_white = _stable_step(white, stable_white, full)
+        if next_black == stable_black and next_white == stable_white:
+            return stable_black, stable_white
+        stable_black, stable_white = next_black, next_white
+
+
+def stable_counts(board):
+    # Number of stable (black, white) discs on any board with black/white masks
+    stable_black, stable_white = stable_masks(board.black, board.white)
+    return stable_black.bit_count(), stable_white.bit_count()
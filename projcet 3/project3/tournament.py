@@ -0,0 +1,313 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from board import Board
+from player import (EvaluativePlayer, ExpectimaxPlayer, FirstValidMovePlayer, IntelligentPlayer, MCTSPlayer,
+                    Minimaxplayer, PolicyPlayer, RandomPlayer)
+from rollout import BLACK, WHITE
+from simulator import BatchGames, get_policy, play_match
+
+# Player spec name -> (class, {spec option: constructor argument})
+PLAYERS = {
+    'minimax': (Minimaxplayer, {'depth': 'depth', 'tt': 'tt_size', 'ms': 'time_ms', 'book': 'book',
+                                'endgame': 'endgame', 'stats': 'stats', 'eval': 'evaluator'}),
+    'expectimax': (ExpectimaxPlayer, {'depth': 'depth', 'pruning': 'pruning', 'book': 'book', 'endgame': 'endgame',
+                                      'stats': 'stats', 'eval': 'evaluator'}),
+    'mcts': (MCTSPlayer, {'sims': 'simulations', 'ms': 'time_ms', 'c': 'exploration',
+                          'selection': 'selection', 'leaf': 'leaf_playouts', 'seed': 'seed',
+                          'book': 'book', 'endgame': 'endgame', 'stats': 'stats'}),
+    'random': (RandomPlayer, {}),
+    'intelligent': (IntelligentPlayer, {'eval': 'evaluator'}),
+    'first': (FirstValidMovePlayer, {}),
+    'evaluative': (EvaluativePlayer, {}),
+    # Games between two batch players are all played at once by the NumPy simulator
+    'batch': (PolicyPlayer, {'policy': 'policy', 'seed': 'seed'}),
+}
+
+
+def _parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False}.get(text.lower(), text)
+
+
+def parse_spec(spec):
+    """'mcts:sims=2000,c=1.0' -> ('mcts', {'simulations': 2000, 'exploration': 1.0})."""
+    name, _, options = spec.partition(':')
+    if name not in PLAYERS:
+        raise ValueError(f"unknown player {name!r}, expected one of {', '.join(PLAYERS)}")
+    aliases = PLAYERS[name][1]
+    kwargs = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key not in aliases:
+            raise ValueError(f"unknown option {key!r} for {name}, expected one of {', '.join(aliases) or 'none'}")
+        kwargs[aliases[key]] = _parse_value(value)
+    return name, kwargs
+
+
+def make_player(spec, color):
+    name, kwargs = parse_spec(spec)
+    return PLAYERS[name][0](color, **kwargs)
+
+
+def batch_policy(spec):
+    # The simulator policy of a batch player spec, None for any other player
+    name, kwargs = parse_spec(spec)
+    return get_policy(kwargs.get('policy', 'greedy')) if name == 'batch' else None
+
+
+def random_opening(seed, plies):
+    # Board after `plies` random moves (fewer if the game ends), black first
+    rng = random.Random(seed)
+    board = Board()
+    color = 'B'
+    moves = []
+    for _ in range(plies):
+        valid_moves = board.get_valid_moves(color)
+        if not valid_moves:
+            if not board.get_valid_moves('W' if color == 'B' else 'B'):
+                break
+            moves.append(None)
+        else:
+            move = rng.choice(valid_moves)
+            board.place_disc(move[0], move[1], color)
+            moves.append(move)
+        color = 'W' if color == 'B' else 'B'
+    return board, color, moves
+
+
+def play_game(task):
+    """Play one game without any output; returns its record."""
+    index, black_spec, white_spec, opening_seed, opening_plies = task
+    board, color, opening = random_opening(opening_seed, opening_plies)
+    times = {'B': 0.0, 'W': 0.0}
+    counts = {'B': 0, 'W': 0}
+    forfeit = None
+    # Players print their moves; a game in a pool worker has no one to read that
+    with contextlib.redirect_stdout(io.StringIO()):
+        players = {'B': make_player(black_spec, 'B'), 'W': make_player(white_spec, 'W')}
+        random.seed(opening_seed)  # players that use the global generator
+        try:
+            while True:
+                valid_moves = board.get_valid_moves(color)
+                opponent = 'W' if color == 'B' else 'B'
+                if valid_moves:
+                    start = time.perf_counter()
+                    move = players[color].make_move(board)
+                    times[color] += time.perf_counter() - start
+                    counts[color] += 1
+                    if move is None or tuple(move) not in valid_moves:
+                        forfeit = color
+                        break
+                    board.place_disc(move[0], move[1], color)
+                elif not board.get_valid_moves(opponent):
+                    break
+                color = opponent
+        finally:
+            for player in players.values():
+                player.close()
+
+    black_discs, white_discs = board.get_score()
+    if forfeit is not None:
+        result = 0.0 if forfeit == 'B' else 1.0
+    else:
+        result = 1.0 if black_discs > white_discs else 0.0 if black_discs < white_discs else 0.5
+    return {
+        'game': index,
+        'black': black_spec,
+        'white': white_spec,
+        'opening_seed': opening_seed,
+        'opening': ' '.join('pass' if move is None else f"{move[0]}{move[1]}" for move in opening),
+        'black_discs': black_discs,
+        'white_discs': white_discs,
+        'result': result,  # black's score: 1 win, 0.5 draw, 0 loss
+        'forfeit': forfeit or '',
+        'black_moves': counts['B'],
+        'white_moves': counts['W'],
+        'black_ms_per_move': 1000 * times['B'] / counts['B'] if counts['B'] else 0.0,
+        'white_ms_per_move': 1000 * times['W'] / counts['W'] if counts['W'] else 0.0,
+    }
+
+
+def play_batch(tasks):
+    """Play games between the same two batch players in one NumPy batch; returns their records."""
+    _, black_spec, white_spec, seed, _ = tasks[0]
+    openings = [random_opening(task[3], task[4]) for task in tasks]
+    games = BatchGames([board.black for board, _, _ in openings], [board.white for board, _, _ in openings],
+                       [BLACK if color == 'B' else WHITE for _, color, _ in openings])
+    start = time.perf_counter()
+    play_match(batch_policy(black_spec), batch_policy(white_spec), seed=seed, games=games)
+    ms_per_move = 1000 * (time.perf_counter() - start) / max(1, int(games.moves.sum()))
+    records = []
+    for game, ((index, _, _, opening_seed, _), (_, _, opening)) in enumerate(zip(tasks, openings)):
+        black_discs, white_discs = int(games.black[game]).bit_count(), int(games.white[game]).bit_count()
+        black_moves, white_moves = int(games.moves[game, BLACK]), int(games.moves[game, WHITE])
+        records.append({
+            'game': index,
+            'black': black_spec,
+            'white': white_spec,
+            'opening_seed': opening_seed,
+            'opening': ' '.join('pass' if move is None else f"{move[0]}{move[1]}" for move in opening),
+            'black_discs': black_discs,
+            'white_discs': white_discs,
+            'result': 1.0 if black_discs > white_discs else 0.0 if black_discs < white_discs else 0.5,
+            'forfeit': '',
+            'black_moves': black_moves,
+            'white_moves': white_moves,
+            'black_ms_per_move': ms_per_move if black_moves else 0.0,
+            'white_ms_per_move': ms_per_move if white_moves else 0.0,
+        })
+    return records
+
+
+def elo_interval(scores, z=1.96):
+    # Elo difference from per-game scores of 1, 0.5 or 0, with a Wilson score interval on
+    # the score fraction: (elo, low, high). A sweep still bounds the rating on one side
+    def to_elo(fraction):
+        if fraction <= 0:
+            return -math.inf
+        if fraction >= 1:
+            return math.inf
+        return -400 * math.log10(1 / fraction - 1)
+
+    games = len(scores)
+    mean = sum(scores) / games
+    spread = z * z / games
+    center = (mean + spread / 2) / (1 + spread)
+    margin = z * math.sqrt(mean * (1 - mean) / games + spread / (4 * games)) / (1 + spread)
+    return to_elo(mean), to_elo(center - margin), to_elo(center + margin)
+
+
+def summarize(records, specs):
+    """Per-pairing win/draw/loss and Elo of the first player, plus per-player time per move."""
+    pairings = []
+    for first, second in combinations(specs, 2):
+        scores = []
+        for record in records:
+            if (record['black'], record['white']) == (first, second):
+                scores.append(record['result'])
+            elif (record['black'], record['white']) == (second, first):
+                scores.append(1 - record['result'])
+        if not scores:
+            continue
+        rating, low, high = elo_interval(scores)
+        pairings.append({
+            'player': first,
+            'opponent': second,
+            'games': len(scores),
+            'wins': scores.count(1.0),
+            'draws': scores.count(0.5),
+            'losses': scores.count(0.0),
+            'score': sum(scores) / len(scores),
+            'elo': rating,
+            'elo_low': low,
+            'elo_high': high,
+        })
+
+    players = []
+    for spec in specs:
+        moves = 0
+        total_ms = 0.0
+        for record in records:
+            for side in ('black', 'white'):
+                if record[side] == spec:
+                    moves += record[f'{side}_moves']
+                    total_ms += record[f'{side}_ms_per_move'] * record[f'{side}_moves']
+        players.append({'player': spec, 'moves': moves, 'ms_per_move': total_ms / moves if moves else 0.0})
+    return {'pairings': pairings, 'players': players}
+
+
+def schedule(specs, games, opening_plies, seed):
+    # Games of every pairing in colour-swapped pairs sharing an opening
+    rng = random.Random(seed)
+    tasks = []
+    for first, second in combinations(specs, 2):
+        for pair in range((games + 1) // 2):
+            opening_seed = rng.getrandbits(32)
+            tasks.append((len(tasks), first, second, opening_seed, opening_plies))
+            if 2 * pair + 1 < games:
+                tasks.append((len(tasks), second, first, opening_seed, opening_plies))
+    return tasks
+
+
+def run(specs, games, workers=None, opening_plies=4, seed=0):
+    for spec in specs:
+        batch_policy(spec)  # fail before starting any process
+    tasks = schedule(specs, games, opening_plies, seed)
+    # Games between two batch players go to the simulator, one batch per colour assignment
+    batches = {}
+    for task in tasks:
+        if batch_policy(task[1]) is not None and batch_policy(task[2]) is not None:
+            batches.setdefault(task[1:3], []).append(task)
+    batched = {task[0] for group in batches.values() for task in group}
+    tasks = [task for task in tasks if task[0] not in batched]
+    records = [record for group in batches.values() for record in play_batch(group)]
+    if workers == 1:
+        records += [play_game(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            records += list(pool.map(play_game, tasks))
+    records.sort(key=lambda record: record['game'])
+    return records, summarize(records, specs)
+
+
+def _json_number(value):
+    # JSON has no infinity
+    return None if isinstance(value, float) and math.isinf(value) else value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play engine-vs-engine Othello games without a display. Every pair of players "
+                    "meets in --games games, in colour-swapped pairs that share a random opening.")
+    parser.add_argument("players", nargs='+',
+                        help="player specs such as minimax:depth=4, mcts:sims=2000 or random "
+                             f"(players: {', '.join(PLAYERS)})")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves played before the engines take over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the game records and summary to this JSON file")
+    parser.add_argument("--csv", help="write one row per game to this CSV file")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("need at least two players")
+
+    try:
+        records, summary = run(args.players, args.games, args.workers, args.opening_plies, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+
+    for pairing in summary['pairings']:
+        print(f"{pairing['player']} vs {pairing['opponent']}: +{pairing['wins']} ={pairing['draws']} "
+              f"-{pairing['losses']}  Elo {pairing['elo']:+.0f} [{pairing['elo_low']:+.0f}, {pairing['elo_high']:+.0f}]")
+    for player in summary['players']:
+        print(f"{player['player']}: {player['ms_per_move']:.1f} ms/move over {player['moves']} moves")
+
+    if args.json:
+        summary = {key: [{name: _json_number(value) for name, value in row.items()} for row in rows]
+                   for key, rows in summary.items()}
+        with open(args.json, 'w') as handle:
+            json.dump({'players': args.players, 'games': records, 'summary': summary}, handle, indent=2)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(records[0]))
+            writer.writeheader()
+            writer.writerows(records)
+
+
+if __name__ == "__main__":
+    main()
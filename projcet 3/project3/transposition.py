@@ -0,0 +1,75 @@
+import sys
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (search failed high)
+UPPER = 2  # score is an upper bound (search failed low)
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by Zobrist position key.
+
+    Each slot holds one (key, depth, score, flag, move, generation) tuple.
+    A slot is replaced when it is empty, holds the same position, was written
+    by an earlier search, or was searched no deeper than the new result.
+    """
+
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.filled = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def new_search(self):
+        # Age existing entries so they lose to fresh results, and start new counters
+        self.generation += 1
+        self.reset_stats()
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.filled = 0
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def peek(self, key):
+        # Like probe, but not counted: for lookups that only order moves
+        entry = self.slots[key % self.size]
+        return entry if entry is not None and entry[0] == key else None
+
+    def store(self, key, depth, score, flag, move):
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is None:
+            self.filled += 1
+        elif entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+        self.slots[index] = (key, depth, score, flag, move, self.generation)
+        self.stores += 1
+
+    def memory_bytes(self):
+        # Slot array plus the entry tuples; keys and moves are counted at their usual size
+        entry_bytes = sys.getsizeof((0, 0, 0, 0, None, 0)) + sys.getsizeof(1 << 63) + sys.getsizeof((0, 0))
+        return sys.getsizeof(self.slots) + self.filled * entry_bytes
+
+    def stats(self):
+        return {
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'cutoffs': self.cutoffs,
+            'stores': self.stores,
+            'filled': self.filled,
+            'memory_bytes': self.memory_bytes(),
+        }
@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from board import Board
+from perft import board_from_text, board_to_text
+from tournament import make_player, parse_spec
+
+# A game as the colour that moved first, the colours whose moves are checked, and
+# every ply in order with None for a pass
+GameRecord = namedtuple('GameRecord', ['first', 'checked', 'moves'])
+
+COLUMNS = 'abcdefgh'
+
+
+def move_to_text(move):
+    return '--' if move is None else f"{COLUMNS[move[1]]}{move[0] + 1}"
+
+
+def move_from_text(text):
+    return None if text == '--' else (int(text[1]) - 1, COLUMNS.index(text[0]))
+
+
+def save_records(records, path):
+    """Write records one per line: first colour, checked colours and the moves, e.g. `W W e6f4--c3`."""
+    with open(path, 'w') as handle:
+        for record in records:
+            handle.write(f"{record.first} {record.checked} {''.join(move_to_text(move) for move in record.moves)}\n")
+
+
+def load_records(path):
+    records = []
+    with open(path) as handle:
+        for line in handle:
+            line = line.split('#')[0].strip()
+            if line:
+                first, checked, moves = line.split()
+                records.append(GameRecord(first, checked, [move_from_text(moves[i:i + 2])
+                                                           for i in range(0, len(moves), 2)]))
+    return records
+
+
+def _game_over(board):
+    # Same test as Game.is_game_over
+    return board.is_full() or not (board.get_valid_moves('B') or board.get_valid_moves('W'))
+
+
+def _fixture_move(move):
+    return None if move is None or move[0] is None else tuple(move)
+
+
+def minimax_fixture(moves):
+    # minimaxvsminimax.pickle: every ply of a Minimaxplayer('W') vs Minimaxplayer('B') game
+    return GameRecord('W', 'WB', [_fixture_move(move) for move in moves])
+
+
+def random42_fixture(moves):
+    # random42.pickle only holds white's (minimax) moves. Black was RandomPlayer, which seeds
+    # the global generator with 42 and picks random.choice of its valid moves, so its
+    # moves are regenerated the same way.
+    rng = random.Random(42)
+    board = Board()
+    color = 'W'
+    plies = []
+    white_moves = iter(moves)
+    while not _game_over(board):
+        if color == 'W':
+            move = next(white_moves, False)
+            if move is False:
+                break
+            move = _fixture_move(move)
+        else:
+            valid_moves = board.get_valid_moves('B')
+            move = rng.choice(valid_moves) if valid_moves else None
+        if move is not None:
+            board.place_disc(move[0], move[1], color)
+        plies.append(move)
+        color = 'W' if color == 'B' else 'B'
+    return GameRecord('W', 'W', plies)
+
+
+FIXTURES = {'random42': random42_fixture, 'minimaxvsminimax': minimax_fixture}
+
+
+def load_fixture(name, directory=os.path.dirname(os.path.abspath(__file__))):
+    with open(os.path.join(directory, f'{name}.pickle'), 'rb') as handle:
+        return FIXTURES[name](pickle.load(handle))
+
+
+def positions(record):
+    # (ply, board text, colour to move, recorded move) of every checked ply
+    board = Board()
+    color = record.first
+    for ply, move in enumerate(record.moves):
+        if color in record.checked:
+            yield ply, board_to_text(board), color, move
+        if move is not None:
+            if not board.place_disc(move[0], move[1], color):
+                raise ValueError(f"illegal move {move_to_text(move)} at ply {ply}")
+        color = 'W' if color == 'B' else 'B'
+
+
+def check_position(task):
+    # The engine's move in one position against the recorded one
+    spec, ply, text, color, expected = task
+    board = board_from_text(text)
+    if not board.get_valid_moves(color):
+        return ply, expected, None, expected is None  # a forced pass
+    with contextlib.redirect_stdout(io.StringIO()):
+        player = make_player(spec, color)
+        try:
+            move = player.make_move(board)
+        finally:
+            player.close()
+    move = None if move is None or move[0] is None else tuple(move)
+    return ply, expected, move, move == expected
+
+
+def verify(record, spec, workers=None):
+    """Per-ply agreement of the engine `spec` with the record; returns (ply, expected, played, agrees) tuples."""
+    tasks = [(spec,) + position for position in positions(record)]
+    if workers == 1:
+        return [check_position(task) for task in tasks]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(check_position, tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay every recorded position through an engine and report how often it plays the recorded move.")
+    parser.add_argument("sources", nargs='*', default=list(FIXTURES),
+                        help=f"fixture names ({', '.join(FIXTURES)}) or game-record files")
+    parser.add_argument("--engine", default="minimax:depth=3", help="player spec, as in tournament.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--save", help="write the records in the compact text format to this file")
+    parser.add_argument("--min-accuracy", type=float, help="exit with status 1 below this percentage")
+    args = parser.parse_args()
+    try:
+        parse_spec(args.engine)
+    except ValueError as error:
+        parser.error(str(error))
+
+    records = []
+    for source in args.sources:
+        if source in FIXTURES:
+            records.append((source, load_fixture(source)))
+        else:
+            records.extend((f"{source}:{index}", record) for index, record in enumerate(load_records(source)))
+    if args.save:
+        save_records([record for _, record in records], args.save)
+
+    total = agreed = 0
+    for name, record in records:
+        start = time.perf_counter()
+        results = verify(record, args.engine, args.workers)
+        elapsed = time.perf_counter() - start
+        matches = sum(agrees for *_, agrees in results)
+        total += len(results)
+        agreed += matches
+        print(f"{name}: {matches}/{len(results)} moves agree ({100 * matches / len(results):.1f}%) in {elapsed:.1f}s")
+        for ply, expected, move, agrees in results:
+            if not agrees:
+                print(f"  ply {ply}: recorded {move_to_text(expected)}, engine {move_to_text(move)}")
+
+    accuracy = 100 * agreed / total if total else 0.0
+    print(f"Agent Accuracy: {accuracy:.1f} % ({agreed}/{total})")
+    if args.min_accuracy is not None and accuracy < args.min_accuracy:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
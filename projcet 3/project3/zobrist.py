@@ -0,0 +1,34 @@
+import random
+
+# Fixed seed so hashes are identical across runs and processes
+_rng = random.Random(0x0DE110)
+
+# One random 64-bit key per (colour, square); square index is row * size + col.
+# Board accepts sizes other than 8, so keys are generated for up to 16x16.
+ZOBRIST = {
+    'B': [_rng.getrandbits(64) for _ in range(256)],
+    'W': [_rng.getrandbits(64) for _ in range(256)],
+}
+# XOR of both colour keys, for flipping a disc from one colour to the other
+ZOBRIST_FLIP = [b ^ w for b, w in zip(ZOBRIST['B'], ZOBRIST['W'])]
+# Mixed into a position hash when white is to move
+ZOBRIST_WHITE_TO_MOVE = _rng.getrandbits(64)
+
+
+def hash_grid(grid):
+    # Full hash of a square grid of None/'B'/'W'
+    h = 0
+    size = len(grid)
+    for row in range(size):
+        for col in range(size):
+            disc = grid[row][col]
+            if disc is not None:
+                h ^= ZOBRIST[disc][row * size + col]
+    return h
+
+
+def position_key(board, color_to_move):
+    # Key for a position plus the side to move
+    if color_to_move == 'W':
+        return board.hash ^ ZOBRIST_WHITE_TO_MOVE
+    return board.hash